@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:35
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def keep_latest_otps(apps, schema_editor):
+    """Delete all but the latest OTP of each email, before it becomes unique."""
+    OTP = apps.get_model("app_auth", "OTP")
+    latest = OTP.objects.values("email").annotate(latest=Max("pk"))
+    OTP.objects.exclude(pk__in=list(latest.values_list("latest", flat=True))).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_auth", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_otps, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="otp",
+            name="email",
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="otp",
+            index=models.Index(fields=["expires_at"], name="app_auth_otp_expires_idx"),
+        ),
+    ]
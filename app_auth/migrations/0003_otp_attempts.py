@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_auth", "0002_otp_unique_email"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="otp",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -1,44 +1,81 @@
-import random
-import string
-
-from django.db import models
+from django.db import connection, models
+from django.db.models import F
 from django.utils import timezone
 
+from app_auth.otp import MAX_ATTEMPTS, OTP_TTL, make_otp
+
+PURGE_BATCH_SIZE = 1000
+
 
 class OTP(models.Model):
-    email = models.EmailField()
+    # One row per email, replaced by each new OTP
+    email = models.EmailField(unique=True)
     otp = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     is_used = models.BooleanField(default=False)
+    # Wrong guesses; the OTP is refused once MAX_ATTEMPTS were made
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Finds expired rows to purge
+            models.Index(fields=["expires_at"], name="app_auth_otp_expires_idx"),
+        ]
 
     @classmethod
     def generate_otp(cls, email: str) -> str:
-        """Generate a new OTP for the given email"""
-        # Delete any existing unused OTPs for this email
-        cls.objects.filter(email=email, is_used=False).delete()
+        """Generate a new OTP for the given email, with one INSERT ... UPDATE"""
+        otp = make_otp()
+        now = timezone.now()
+        # MySQL upserts on any unique key and takes no conflict target.
+        cls.objects.bulk_create(
+            [cls(email=email, otp=otp, created_at=now, expires_at=now + OTP_TTL)],
+            update_conflicts=True,
+            unique_fields=(
+                ["email"]
+                if connection.features.supports_update_conflicts_with_target
+                else None
+            ),
+            update_fields=["otp", "created_at", "expires_at", "is_used", "attempts"],
+        )
+        return otp
 
-        # Generate a new 6-digit OTP
-        otp = "".join(random.choices(string.digits, k=6))
+    @classmethod
+    def validate_otp(cls, email: str, otp: str) -> bool:
+        """
+        Validate the OTP for the given email, with one UPDATE.
 
-        # Create new OTP record
-        cls.objects.create(
+        A wrong guess takes a second UPDATE to count it, and the OTP is
+        refused once MAX_ATTEMPTS wrong guesses were made.
+        """
+        pending = cls.objects.filter(
             email=email,
-            otp=otp,
-            expires_at=timezone.now() + timezone.timedelta(minutes=15),
+            is_used=False,
+            expires_at__gt=timezone.now(),
+            attempts__lt=MAX_ATTEMPTS,
         )
-
-        return otp
+        if pending.filter(otp=otp).update(is_used=True):
+            return True
+        pending.update(attempts=F("attempts") + 1)
+        return False
 
     @classmethod
-    def validate_otp(cls, email: str, otp: str) -> bool:
-        """Validate the OTP for the given email"""
-        try:
-            otp_obj = cls.objects.get(
-                email=email, otp=otp, is_used=False, expires_at__gt=timezone.now()
+    def purge_expired(cls, batch_size=PURGE_BATCH_SIZE):
+        """
+        Delete expired OTPs, ``batch_size`` rows per DELETE.
+
+        Returns:
+            int: Number of OTPs deleted
+        """
+        now = timezone.now()
+        deleted = 0
+        while True:
+            pks = list(
+                cls.objects.filter(expires_at__lte=now).values_list("pk", flat=True)[
+                    :batch_size
+                ]
             )
-            otp_obj.is_used = True
-            otp_obj.save()
-            return True
-        except cls.DoesNotExist:
-            return False
+            if not pks:
+                return deleted
+            deleted += cls.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,108 @@
+import secrets
+import string
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+
+OTP_LENGTH = 6
+OTP_TTL = timedelta(minutes=15)
+REDIS_KEY_PREFIX = "otp:"
+# Wrong guesses allowed before the pending OTP is dropped
+MAX_ATTEMPTS = 5
+# Deletes the pending OTP if it matches, or once MAX_ATTEMPTS wrong guesses
+# have been made against it
+CONSUME_SCRIPT = """
+local otp = redis.call("HGET", KEYS[1], "otp")
+if not otp then
+    return 0
+end
+if otp == ARGV[1] then
+    redis.call("DEL", KEYS[1])
+    return 1
+end
+if redis.call("HINCRBY", KEYS[1], "attempts", 1) >= tonumber(ARGV[2]) then
+    redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+_backend = None
+
+
+def make_otp():
+    return "".join(secrets.choice(string.digits) for _ in range(OTP_LENGTH))
+
+
+class OTPBackend:
+    """
+    Store of pending OTPs, one per email.
+
+    ``generate()`` and ``validate()`` each take a single round trip to the
+    store; a wrong guess costs the database backend a second one. Both
+    backends refuse an OTP once MAX_ATTEMPTS wrong guesses were made.
+    """
+
+    def generate(self, email: str) -> str:
+        """Generate a new OTP for the email, replacing its pending one"""
+        raise NotImplementedError
+
+    def validate(self, email: str, otp: str) -> bool:
+        """Use up the OTP if it is the pending, unexpired OTP of the email"""
+        raise NotImplementedError
+
+
+class DatabaseOTPBackend(OTPBackend):
+    """OTP rows, purged once expired by purge_expired_otps_task."""
+
+    def generate(self, email):
+        from app_auth.models import OTP
+
+        return OTP.generate_otp(email)
+
+    def validate(self, email, otp):
+        from app_auth.models import OTP
+
+        return OTP.validate_otp(email, otp)
+
+
+class RedisOTPBackend(OTPBackend):
+    """One hash per email with the OTP and its wrong guesses, expired by Redis."""
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+        self.consume = self.client.register_script(CONSUME_SCRIPT)
+
+    def generate(self, email):
+        otp = make_otp()
+        key = f"{REDIS_KEY_PREFIX}{email}"
+        # MULTI/EXEC in one round trip; resets the attempts of the old OTP
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={"otp": otp, "attempts": 0})
+        pipe.expire(key, OTP_TTL)
+        pipe.execute()
+        return otp
+
+    def validate(self, email, otp):
+        return bool(
+            self.consume(keys=[f"{REDIS_KEY_PREFIX}{email}"], args=[otp, MAX_ATTEMPTS])
+        )
+
+
+def get_otp_backend():
+    """Return the OTP backend chosen by the OTP_BACKEND setting."""
+    global _backend
+    if _backend is None:
+        if settings.OTP_BACKEND == "redis":
+            _backend = RedisOTPBackend(settings.REDIS_URL)
+        else:
+            _backend = DatabaseOTPBackend()
+    return _backend
+
+
+def generate_otp(email: str) -> str:
+    return get_otp_backend().generate(email)
+
+
+def validate_otp(email: str, otp: str) -> bool:
+    return get_otp_backend().validate(email, otp)
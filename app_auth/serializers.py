@@ -7,6 +7,7 @@ from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from app_auth.models import OTP
+from app_auth.otp import validate_otp
 
 User = get_user_model()
 
@@ -187,6 +188,6 @@ class OTPRegisterSerializer(serializers.ModelSerializer):
         fields = ["first_name", "last_name", "email", "otp"]
 
     def validate(self, attrs):
-        if not OTP.validate_otp(attrs["email"], attrs["otp"]):
+        if not validate_otp(attrs["email"], attrs["otp"]):
             raise serializers.ValidationError({"otp": "Invalid or expired OTP"})
         return attrs
@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from app_auth.models import OTP
+
+
+@shared_task
+def purge_expired_otps_task():
+    """
+    Celery beat task to delete expired OTP rows
+
+    Returns:
+        int: Number of OTPs deleted
+    """
+    return OTP.purge_expired()
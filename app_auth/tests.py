@@ -1,3 +1,105 @@
+from datetime import timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+
+from app_auth.models import OTP
+from app_auth.otp import (
+    MAX_ATTEMPTS,
+    OTP_LENGTH,
+    OTP_TTL,
+    DatabaseOTPBackend,
+    RedisOTPBackend,
+    make_otp,
+)
+
+
+def wrong_otp(otp):
+    return "0" * OTP_LENGTH if otp != "0" * OTP_LENGTH else "1" * OTP_LENGTH
+
+
+class DatabaseOTPBackendTests(TestCase):
+    def setUp(self):
+        self.backend = DatabaseOTPBackend()
+        self.otp = self.backend.generate("owner@example.com")
+
+    def test_otp_is_used_once(self):
+        self.assertFalse(
+            self.backend.validate("owner@example.com", wrong_otp(self.otp))
+        )
+        self.assertTrue(self.backend.validate("owner@example.com", self.otp))
+        self.assertFalse(self.backend.validate("owner@example.com", self.otp))
+
+    def test_new_otp_replaces_pending_one(self):
+        otp = self.backend.generate("owner@example.com")
+
+        self.assertEqual(OTP.objects.count(), 1)
+        if otp != self.otp:
+            self.assertFalse(self.backend.validate("owner@example.com", self.otp))
+        self.assertTrue(self.backend.validate("owner@example.com", otp))
+
+    def test_expired_otp_is_refused(self):
+        OTP.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertFalse(self.backend.validate("owner@example.com", self.otp))
+
+    def test_otp_is_refused_after_max_attempts(self):
+        for _ in range(MAX_ATTEMPTS):
+            self.backend.validate("owner@example.com", wrong_otp(self.otp))
+
+        self.assertFalse(self.backend.validate("owner@example.com", self.otp))
+        # A new OTP starts over
+        otp = self.backend.generate("owner@example.com")
+        self.assertTrue(self.backend.validate("owner@example.com", otp))
+
+    def test_wrong_guesses_below_the_limit_keep_the_otp(self):
+        for _ in range(MAX_ATTEMPTS - 1):
+            self.backend.validate("owner@example.com", wrong_otp(self.otp))
+
+        self.assertTrue(self.backend.validate("owner@example.com", self.otp))
+
+    def test_purge_expired(self):
+        self.backend.generate("other@example.com")
+        OTP.objects.filter(email="other@example.com").update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        self.assertEqual(OTP.purge_expired(batch_size=1), 1)
+        self.assertEqual(
+            list(OTP.objects.values_list("email", flat=True)), ["owner@example.com"]
+        )
+
+
+class RedisOTPBackendTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("app_auth.otp.redis.Redis.from_url")
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.backend = RedisOTPBackend("redis://localhost:6379")
+
+    def test_generate_resets_attempts_and_sets_ttl(self):
+        otp = self.backend.generate("owner@example.com")
+
+        pipe = self.client.pipeline.return_value
+        pipe.hset.assert_called_once_with(
+            "otp:owner@example.com", mapping={"otp": otp, "attempts": 0}
+        )
+        pipe.expire.assert_called_once_with("otp:owner@example.com", OTP_TTL)
+        pipe.execute.assert_called_once_with()
+
+    def test_validate_passes_the_attempt_limit(self):
+        self.client.register_script.return_value.return_value = 0
+
+        self.assertFalse(self.backend.validate("owner@example.com", "123456"))
+        self.client.register_script.return_value.assert_called_once_with(
+            keys=["otp:owner@example.com"], args=["123456", MAX_ATTEMPTS]
+        )
+
+
+class MakeOTPTests(TestCase):
+    def test_otp_is_digits(self):
+        otp = make_otp()
 
-# Create your tests here.
+        self.assertEqual(len(otp), OTP_LENGTH)
+        self.assertTrue(otp.isdigit())
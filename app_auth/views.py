@@ -26,7 +26,7 @@ from app_auth.serializers import (
 )
 from app_email.services import EmailService
 
-from .models import OTP
+from .otp import generate_otp, validate_otp
 
 User = get_user_model()
 
@@ -151,7 +151,7 @@ class RequestRegisterOTPView(APIView):
         serializer.is_valid(raise_exception=True)
 
         email = request.data["email"]
-        otp = OTP.generate_otp(email)
+        otp = generate_otp(email)
 
         # Send OTP via email
         EmailService.send_email(
@@ -211,7 +211,7 @@ class RequestLoginOTPView(APIView):
         if not user:
             raise ValidationError({"email": "User with this email is not registered"})
 
-        otp = OTP.generate_otp(email)
+        otp = generate_otp(email)
 
         # Send OTP via email
         EmailService.send_email(
@@ -236,7 +236,7 @@ class ValidateLoginOTPView(APIView):
         email = request.data["email"]
         otp = request.data["otp"]
 
-        if not OTP.validate_otp(email, otp):
+        if not validate_otp(email, otp):
             raise ValidationError({"otp": "Invalid or expired OTP"})
 
         # Generate JWT tokens
@@ -0,0 +1,106 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from app_files.models import SecureFile
+
+
+def legacy_slug():
+    """Generate a slug the way CoreModel did before: random, checked with a SELECT."""
+    while True:
+        slug = random.choice(string.ascii_letters) + "".join(
+            random.choices(string.ascii_letters + string.digits, k=11)
+        )
+        if not SecureFile.objects.filter(slug=slug).exists():
+            return slug
+
+
+def build_file(**kwargs):
+    # No stored file, so no storage work is queued
+    return SecureFile(
+        original_filename="benchmark.pdf",
+        content_type="application/pdf",
+        file_size=0,
+        **kwargs,
+    )
+
+
+def insert_with_select():
+    build_file(slug=legacy_slug()).save()
+
+
+def insert_without_select():
+    build_file().save()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare CoreModel (SecureFile) insert throughput with and without the "
+        "slug pre-check SELECT. Runs against a test database created for the "
+        "run and destroyed afterwards, never the configured one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=1000,
+            help="Number of rows inserted per variant (default: 1000).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows per bulk_create call (default: 500).",
+        )
+
+    def measure(self, label, rows, insert):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            insert()
+            elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"{label:<28} {rows / elapsed:>10.0f} rows/s  "
+            f"{len(queries) / rows:>5.2f} queries/row"
+        )
+        return rows / elapsed
+
+    def handle(self, *args, **options):
+        # Inserts are measured in autocommit like in production, so they
+        # cannot be rolled back: use a throwaway database
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_benchmark(self, options):
+        rows = options["rows"]
+        batch_size = options["batch_size"]
+
+        def bulk_insert():
+            for start in range(0, rows, batch_size):
+                count = min(batch_size, rows - start)
+                SecureFile.objects.bulk_create([build_file() for _ in range(count)])
+
+        legacy = self.measure(
+            "SELECT + INSERT", rows, lambda: [insert_with_select() for _ in range(rows)]
+        )
+        single = self.measure(
+            "INSERT only", rows, lambda: [insert_without_select() for _ in range(rows)]
+        )
+        bulk = self.measure("bulk_create, preallocated", rows, bulk_insert)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Without the SELECT: {single / legacy:.1f}x, "
+                f"bulk: {bulk / legacy:.1f}x the legacy throughput."
+            )
+        )
@@ -1,14 +1,129 @@
-import random
+import re
+import secrets
 import string
+import time
 
 from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models.signals import pre_save
+from django.db import IntegrityError, models, router, transaction
+from django.db.models.signals import class_prepared, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 # Core Model for the application
 User = get_user_model()
 
+# Slugs are 12 base36 characters: 6 encode the seconds since SLUG_EPOCH, so
+# new slugs sort (and land in the index) roughly in creation order, and 6 are
+# random, about 31 bits per second. The alphabet is in ASCII order so that
+# lexical order follows time order, and has no upper case: MySQL's default
+# collations compare "A" and "a" as equal, which would break both the order
+# and the uniqueness of mixed-case slugs.
+SLUG_ALPHABET = string.digits + string.ascii_lowercase
+SLUG_LENGTH = 12
+SLUG_TIME_LENGTH = 6
+SLUG_EPOCH = 1704067200  # 2024-01-01 UTC, the time part lasts until 2092
+# Inserts retried with a fresh slug after a unique violation on the slug
+SLUG_MAX_ATTEMPTS = 3
+# Unique violations: MySQL ER_DUP_ENTRY and SQLite SQLITE_CONSTRAINT_UNIQUE
+MYSQL_DUP_ENTRY = 1062
+SQLITE_CONSTRAINT_UNIQUE = 2067
+# Key of a MySQL duplicate entry, "<table>.<key>" since MySQL 8.0.19
+MYSQL_DUP_KEY_RE = re.compile(r"for key '(?:(?P<table>[^']+)\.)?(?P<key>[^'.]+)'$")
+
+
+def new_slug(now=None):
+    """Return a time-ordered random slug, without checking the database."""
+    seconds = int(now if now is not None else time.time()) - SLUG_EPOCH
+    prefix = []
+    for _ in range(SLUG_TIME_LENGTH):
+        seconds, digit = divmod(seconds, len(SLUG_ALPHABET))
+        prefix.append(SLUG_ALPHABET[digit])
+    return "".join(reversed(prefix)) + "".join(
+        secrets.choice(SLUG_ALPHABET) for _ in range(SLUG_LENGTH - SLUG_TIME_LENGTH)
+    )
+
+
+def is_slug_violation(error, model):
+    """
+    Tell whether an IntegrityError is a duplicate slug of the model.
+
+    Decided on the backend error code and the violated key, not on the
+    wording of the message. The unique slug column is a MySQL key named
+    ``slug``; SQLite names the columns of the violated constraint.
+    """
+    table = model._meta.db_table
+    cause = error.__cause__
+    if getattr(cause, "sqlite_errorcode", None) == SQLITE_CONSTRAINT_UNIQUE:
+        return str(cause) == f"UNIQUE constraint failed: {table}.slug"
+    if len(error.args) == 2 and error.args[0] == MYSQL_DUP_ENTRY:
+        key = MYSQL_DUP_KEY_RE.search(str(error.args[1]))
+        return (
+            key is not None and key["key"] == "slug" and key["table"] in (None, table)
+        )
+    return False
+
+
+class CoreQuerySet(models.QuerySet):
+    """
+    Bulk operations that do what ``CoreModel.save()`` and its ``pre_save``
+    receiver do for single rows, with a constant number of queries.
+    """
+
+    def bulk_create(self, objs, updated_by=None, **kwargs):
+        """
+        ``bulk_create`` that assigns slugs to the objects that have none.
+
+        Slugs come from ``allocate_slugs()``, without a query. On the
+        (unlikely) unique violation they are replaced and the insert retried
+        inside a savepoint.
+        """
+        objs = list(objs)
+        if updated_by is not None:
+            for obj in objs:
+                obj.updated_by = updated_by
+        generated = [obj for obj in objs if not obj.slug]
+        if not generated:
+            return super().bulk_create(objs, **kwargs)
+
+        for attempt in range(SLUG_MAX_ATTEMPTS):
+            for obj, slug in zip(generated, self.model.allocate_slugs(len(generated))):
+                obj.slug = slug
+            try:
+                with transaction.atomic(using=self.db):
+                    return super().bulk_create(objs, **kwargs)
+            except IntegrityError as e:
+                if (
+                    not is_slug_violation(e, self.model)
+                    or attempt == SLUG_MAX_ATTEMPTS - 1
+                ):
+                    raise
+
+    def bulk_update(self, objs, fields, updated_by=None, **kwargs):
+        """
+        ``bulk_update`` that also stamps ``dtm_updated`` and ``updated_by``,
+        which ``auto_now`` does not do for bulk updates.
+        """
+        objs = list(objs)
+        now = timezone.now()
+        fields = list(fields) + ["dtm_updated"]
+        if updated_by is not None:
+            fields.append("updated_by")
+        for obj in objs:
+            obj.dtm_updated = now
+            if updated_by is not None:
+                obj.updated_by = updated_by
+        return super().bulk_update(objs, list(dict.fromkeys(fields)), **kwargs)
+
+    def bulk_delete(self):
+        """
+        Delete the rows of this queryset. Models whose ``post_delete`` work
+        runs a query per row override this with a batched version.
+        """
+        return self.delete()
+
+
+CoreManager = models.Manager.from_queryset(CoreQuerySet)
+
 
 class CoreModel(models.Model):
     dtm_created = models.DateTimeField(auto_now_add=True)
@@ -21,19 +136,69 @@ class CoreModel(models.Model):
         related_name="updated_%(class)s",
     )
 
+    objects = CoreManager()
+
     def generate_slug(self):
-        while True:
-            slug_candidate = random.choice(string.ascii_letters) + "".join(
-                random.choices(string.ascii_letters + string.digits, k=11)
-            )
-            if not self.__class__.objects.filter(slug=slug_candidate).exists():
-                return slug_candidate
+        return new_slug()
+
+    @classmethod
+    def allocate_slugs(cls, count):
+        """
+        Return ``count`` distinct slugs for objects about to be bulk created.
+
+        No query is made. A collision with an existing row is left to the
+        unique constraint, see ``CoreQuerySet.bulk_create()``.
+        """
+        now = time.time()
+        slugs = set()
+        while len(slugs) < count:
+            slugs.add(new_slug(now))
+        return list(slugs)
+
+    def save(self, *args, **kwargs):
+        """
+        Insert with a generated slug, retrying with a new one on a collision.
+
+        Outside a transaction the failed INSERT has no side effects and is
+        simply repeated. Inside one it runs in a savepoint, so a collision
+        does not break the surrounding transaction.
+        """
+        if self.slug or not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get("using") or router.db_for_write(
+            self.__class__, instance=self
+        )
+        in_transaction = transaction.get_connection(using).in_atomic_block
+        for attempt in range(SLUG_MAX_ATTEMPTS):
+            self.slug = self.generate_slug()
+            try:
+                if not in_transaction:
+                    return super().save(*args, **kwargs)
+                with transaction.atomic(using=using):
+                    return super().save(*args, **kwargs)
+            except IntegrityError as e:
+                self._state.adding = True
+                if (
+                    not is_slug_violation(e, type(self))
+                    or attempt == SLUG_MAX_ATTEMPTS - 1
+                ):
+                    raise
 
     class Meta:
         abstract = True
 
 
-@receiver(pre_save)
 def ensure_slug(sender, instance, **kwargs):
-    if isinstance(instance, CoreModel) and not instance.slug:
+    if not instance.slug:
         instance.slug = instance.generate_slug()
+
+
+@receiver(class_prepared)
+def connect_core_model_receivers(sender, **kwargs):
+    # Connected per concrete subclass, so saves of other models (sessions,
+    # tokens, ...) do not go through the receiver at all
+    if issubclass(sender, CoreModel) and not sender._meta.abstract:
+        pre_save.connect(
+            ensure_slug, sender=sender, dispatch_uid=f"ensure_slug_{sender._meta.label}"
+        )
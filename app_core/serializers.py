@@ -0,0 +1,12 @@
+from rest_framework import serializers
+
+# Largest number of rows a bulk request may touch
+BULK_MAX_ITEMS = 1000
+
+
+class SlugListSerializer(serializers.Serializer):
+    slugs = serializers.ListField(
+        child=serializers.CharField(max_length=12),
+        allow_empty=False,
+        max_length=BULK_MAX_ITEMS,
+    )
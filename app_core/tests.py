@@ -1,3 +1,65 @@
+from unittest import mock
+
+from django.db import IntegrityError
 from django.test import TestCase
 
-# Create your tests here.
+from app_core.models import (
+    MYSQL_DUP_ENTRY,
+    SLUG_ALPHABET,
+    SLUG_LENGTH,
+    is_slug_violation,
+    new_slug,
+)
+from app_files.models import FileArchive, SecureFile
+
+
+def create_file(**kwargs):
+    fields = {
+        "original_filename": "report.pdf",
+        "content_type": "application/pdf",
+        "file_size": 0,
+    }
+    return SecureFile.objects.create(**{**fields, **kwargs})
+
+
+class SlugTests(TestCase):
+    def test_slugs_sort_in_time_order_under_any_case_rule(self):
+        slugs = [new_slug(now) for now in (1704067200, 1704067201, 1800000000)]
+
+        self.assertTrue(all(len(slug) == SLUG_LENGTH for slug in slugs))
+        self.assertTrue(all(set(slug) <= set(SLUG_ALPHABET) for slug in slugs))
+        self.assertEqual(slugs, sorted(slugs))
+        self.assertEqual(slugs, sorted(slugs, key=str.lower))
+
+    def test_detects_duplicate_slug(self):
+        secure_file = create_file()
+        with self.assertRaises(IntegrityError) as raised:
+            create_file(slug=secure_file.slug)
+
+        self.assertTrue(is_slug_violation(raised.exception, SecureFile))
+        self.assertFalse(is_slug_violation(raised.exception, FileArchive))
+
+    def test_ignores_other_violations(self):
+        with self.assertRaises(IntegrityError) as raised:
+            create_file(file_size=None)
+
+        self.assertFalse(is_slug_violation(raised.exception, SecureFile))
+
+    def test_detects_mysql_duplicate_key(self):
+        for message, expected in [
+            ("Duplicate entry 'x' for key 'app_files_securefile.slug'", True),
+            ("Duplicate entry 'x' for key 'slug'", True),
+            ("Duplicate entry 'x' for key 'app_files_filearchive.slug'", False),
+            ("Duplicate entry 'slug' for key 'app_files_securefile.PRIMARY'", False),
+        ]:
+            error = IntegrityError(MYSQL_DUP_ENTRY, message)
+            self.assertEqual(is_slug_violation(error, SecureFile), expected, message)
+
+    def test_save_retries_with_a_new_slug(self):
+        taken = create_file().slug
+        with mock.patch.object(
+            SecureFile, "generate_slug", side_effect=[taken, "0" * SLUG_LENGTH]
+        ):
+            secure_file = create_file()
+
+        self.assertEqual(secure_file.slug, "0" * SLUG_LENGTH)
@@ -1,3 +1,119 @@
-from django.shortcuts import render
+from django.db import transaction
+from drf_spectacular.utils import extend_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import FormParser, JSONParser
+from rest_framework.response import Response
 
-# Create your views here.
+from .serializers import BULK_MAX_ITEMS, SlugListSerializer
+
+
+class BulkCoreModelMixin:
+    """
+    Bulk create, partial update and delete for viewsets of CoreModel subclasses.
+
+    Each action runs in one transaction with a constant number of queries,
+    whatever the batch size: slugs are pre-assigned, ``updated_by`` and the
+    timestamps are stamped in one pass by ``CoreQuerySet``. Rows are looked
+    up by slug within ``get_queryset()``, so the viewset's filtering applies.
+    """
+
+    bulk_max_items = BULK_MAX_ITEMS
+
+    def get_bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError("Expected a non-empty list of items")
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(
+                f"At most {self.bulk_max_items} items can be processed at once"
+            )
+        return items
+
+    @extend_schema(description="Create many rows with one insert.")
+    @action(detail=False, methods=["post"], parser_classes=[JSONParser])
+    def bulk_create(self, request):
+        serializer = self.get_serializer(data=self.get_bulk_items(request), many=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            instances = self.perform_bulk_create(serializer)
+        return Response(
+            self.get_serializer(instances, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    def perform_bulk_create(self, serializer):
+        model = self.get_queryset().model
+        return model.objects.bulk_create(
+            [model(**attrs) for attrs in serializer.validated_data],
+            updated_by=self.request.user,
+        )
+
+    @extend_schema(
+        description="Partially update many rows, each item giving its `slug` "
+        "and the fields to change."
+    )
+    @action(detail=False, methods=["patch"], parser_classes=[JSONParser])
+    def bulk_partial_update(self, request):
+        items = self.get_bulk_items(request)
+        slugs = [item.get("slug") if isinstance(item, dict) else None for item in items]
+        if None in slugs or len(set(slugs)) != len(slugs):
+            raise ValidationError("Every item needs a distinct slug")
+
+        with transaction.atomic():
+            instances = (
+                self.get_queryset()
+                .select_for_update()
+                .in_bulk(slugs, field_name="slug")
+            )
+            missing = [slug for slug in slugs if slug not in instances]
+            if missing:
+                raise NotFound({"missing": missing})
+
+            serializers, errors = [], {}
+            for slug, item in zip(slugs, items):
+                serializer = self.get_serializer(
+                    instances[slug], data=item, partial=True
+                )
+                if serializer.is_valid():
+                    serializers.append(serializer)
+                else:
+                    errors[slug] = serializer.errors
+            if errors:
+                raise ValidationError(errors)
+
+            instances = self.perform_bulk_partial_update(serializers)
+        return Response(self.get_serializer(instances, many=True).data)
+
+    def perform_bulk_partial_update(self, serializers):
+        fields = {}
+        for serializer in serializers:
+            for attr, value in serializer.validated_data.items():
+                setattr(serializer.instance, attr, value)
+                fields[attr] = True
+
+        instances = [serializer.instance for serializer in serializers]
+        if fields:
+            self.get_queryset().bulk_update(
+                instances, list(fields), updated_by=self.request.user
+            )
+        return instances
+
+    @extend_schema(description="Delete many rows by slug.", request=SlugListSerializer)
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-delete",
+        parser_classes=[JSONParser, FormParser],
+    )
+    def bulk_destroy(self, request):
+        serializer = SlugListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        deleted, _ = (
+            self.get_queryset()
+            .filter(slug__in=serializer.validated_data["slugs"])
+            .bulk_delete()
+        )
+        return Response({"deleted": deleted})
@@ -0,0 +1,138 @@
+import time
+from datetime import datetime, timezone
+
+import redis
+from django.conf import settings
+from django.db import models
+from django.db.models import Case, F, Value, When
+
+# Redis hashes of file pk -> downloads, and -> last download time (Unix
+# seconds), since the last flush
+ACCESS_COUNTS_KEY = "secure_files:access:counts"
+ACCESS_TIMES_KEY = "secure_files:access:times"
+# The hashes are renamed to these while being flushed
+FLUSH_COUNTS_KEY = f"{ACCESS_COUNTS_KEY}:flushing"
+FLUSH_TIMES_KEY = f"{ACCESS_TIMES_KEY}:flushing"
+FLUSH_LOCK_KEY = "secure_files:access:flush-lock"
+# Longest a download waits on Redis, in seconds
+ACCESS_COUNTER_TIMEOUT = 0.25
+FLUSH_BATCH_SIZE = 1000
+
+_client = None
+
+
+def get_redis_client():
+    """Return the process-wide Redis client of the access counters."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=ACCESS_COUNTER_TIMEOUT,
+            socket_connect_timeout=ACCESS_COUNTER_TIMEOUT,
+        )
+    return _client
+
+
+def record_access(secure_file):
+    """
+    Count a download of the file in Redis, in one round trip.
+
+    Nothing is written to the database. If Redis is unavailable the access
+    is not counted, and the download goes on.
+    """
+    if not settings.SECURE_FILES_ACCESS_COUNTERS:
+        return
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.hincrby(ACCESS_COUNTS_KEY, secure_file.pk, 1)
+        pipe.hset(ACCESS_TIMES_KEY, secure_file.pk, int(time.time()))
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error recording access to {secure_file.slug}: {e}")
+
+
+def update_access_counts(counts, times):
+    """
+    Add buffered counts to their files with one UPDATE.
+
+    Args:
+        counts (dict): File pk -> downloads to add
+        times (dict): File pk -> Unix time of the last download
+
+    Returns:
+        int: Number of files updated, deleted files are skipped
+    """
+    from app_files.models import SecureFile
+
+    return SecureFile.objects.filter(pk__in=counts).update(
+        download_count=F("download_count")
+        + Case(
+            *[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+            default=Value(0),
+            output_field=models.PositiveBigIntegerField(),
+        ),
+        dtm_last_accessed=Case(
+            *[
+                When(
+                    pk=pk,
+                    then=Value(datetime.fromtimestamp(timestamp, tz=timezone.utc)),
+                )
+                for pk, timestamp in times.items()
+            ],
+            default=F("dtm_last_accessed"),
+            output_field=models.DateTimeField(),
+        ),
+    )
+
+
+def flush_access_counts(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Move the access counts buffered in Redis to their SecureFile columns.
+
+    The hashes are renamed first, so downloads made meanwhile go to new ones.
+    Each batch is written with one UPDATE, then removed from Redis; a crash
+    in between counts that batch twice.
+
+    Returns:
+        int: Number of files updated
+    """
+    client = get_redis_client()
+    lock = client.lock(FLUSH_LOCK_KEY, timeout=600)
+    if not lock.acquire(blocking=False):
+        # Another flush is running
+        return 0
+
+    try:
+        # Hashes left by a failed flush are written first, new counts wait
+        if not client.exists(FLUSH_COUNTS_KEY):
+            pipe = client.pipeline()
+            pipe.rename(ACCESS_COUNTS_KEY, FLUSH_COUNTS_KEY)
+            pipe.rename(ACCESS_TIMES_KEY, FLUSH_TIMES_KEY)
+            # Renaming fails when there were no downloads
+            pipe.execute(raise_on_error=False)
+
+        updated = 0
+        cursor = 0
+        while True:
+            cursor, counts = client.hscan(FLUSH_COUNTS_KEY, cursor, count=batch_size)
+            if counts:
+                fields = list(counts)
+                times = client.hmget(FLUSH_TIMES_KEY, fields)
+                updated += update_access_counts(
+                    {int(pk): int(count) for pk, count in counts.items()},
+                    {
+                        int(pk): int(timestamp)
+                        for pk, timestamp in zip(fields, times)
+                        if timestamp is not None
+                    },
+                )
+                pipe = client.pipeline()
+                pipe.hdel(FLUSH_COUNTS_KEY, *fields)
+                pipe.hdel(FLUSH_TIMES_KEY, *fields)
+                pipe.execute()
+            if not cursor:
+                break
+        client.delete(FLUSH_COUNTS_KEY, FLUSH_TIMES_KEY)
+        return updated
+    finally:
+        lock.release()
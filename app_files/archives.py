@@ -0,0 +1,207 @@
+import io
+import os
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from app_files.clients import get_default_s3_client
+from app_files.storage import LocalSecureFileStorage
+
+ARCHIVE_CONTENT_TYPE = "application/zip"
+ARCHIVE_FILENAME = "files.zip"
+# Bytes read from storage at a time, the most buffered per file
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+COMPRESSION_METHODS = {
+    "store": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+}
+
+
+class _ArchiveStream:
+    """
+    Write-only, unseekable target for ZipFile.
+
+    ZipFile then writes sizes and CRCs in data descriptors after each entry
+    instead of seeking back, and the bytes written so far can be taken out
+    and sent.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class ArchiveReader(io.RawIOBase):
+    """Readable, unseekable file over the chunks of ``iter_archive()``."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = b""
+        self.offset = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while self.offset >= len(self.buffer):
+            self.buffer = next(self.chunks, None)
+            self.offset = 0
+            if self.buffer is None:
+                self.buffer = b""
+                return 0
+        length = min(len(target), len(self.buffer) - self.offset)
+        target[:length] = self.buffer[self.offset : self.offset + length]
+        self.offset += length
+        self.bytes_read += length
+        return length
+
+
+def get_archive_names(files):
+    """Return an entry name per file, numbering repeated file names."""
+    names = []
+    seen = set()
+    for secure_file in files:
+        name = os.path.basename(secure_file.original_filename.replace("\\", "/"))
+        name = name or secure_file.slug
+        stem, ext = os.path.splitext(name)
+        candidate = name
+        number = 1
+        while candidate.lower() in seen:
+            candidate = f"{stem} ({number}){ext}"
+            number += 1
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+def iter_file_chunks(secure_file, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """Yield the stored content of a file, streamed from S3 or local disk."""
+    storage = secure_file.file.storage
+    if isinstance(storage, LocalSecureFileStorage):
+        with storage.open(secure_file.file.name, "rb") as file:
+            yield from file.chunks(chunk_size)
+        return
+
+    # Read the object body directly: S3Boto3Storage.open() would spool
+    # the whole object to a temporary file first
+    body = get_default_s3_client().get_object(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=secure_file.get_storage_key()
+    )["Body"]
+    try:
+        yield from body.iter_chunks(chunk_size)
+    finally:
+        body.close()
+
+
+def iter_archive(files, compression="store"):
+    """
+    Yield a ZIP archive of the files, built while their content streams in.
+
+    Memory use stays at about one chunk plus the central directory, whatever
+    the number and size of the files, and nothing is written to disk.
+
+    Args:
+        files (list): SecureFile instances, in archive order
+        compression (str): "store" (files as they are) or "deflate"
+    """
+    stream = _ArchiveStream()
+    compress_type = COMPRESSION_METHODS[compression]
+    with zipfile.ZipFile(stream, "w", compression=compress_type) as archive:
+        for secure_file, name in zip(files, get_archive_names(files)):
+            info = zipfile.ZipInfo(
+                name,
+                date_time=timezone.localtime(secure_file.dtm_updated).timetuple()[:6],
+            )
+            info.compress_type = compress_type
+            info.external_attr = 0o644 << 16
+            # A known size lets zipfile decide on ZIP64 before writing
+            info.file_size = secure_file.file_size
+            with archive.open(info, "w") as entry:
+                for chunk in iter_file_chunks(secure_file):
+                    entry.write(chunk)
+                    if stream.chunks:
+                        yield stream.take()
+    yield stream.take()
+
+
+def get_archive_path(instance, filename):
+    return f"archives/{timezone.now():%Y/%m}/{instance.slug}.zip"
+
+
+def create_archive(user, files, compression="store"):
+    """
+    Record a FileArchive of the files and build it once the transaction commits.
+
+    Returns:
+        FileArchive: The pending archive
+    """
+    from app_files.models import FileArchive
+
+    archive = FileArchive.objects.create(
+        created_by=user,
+        file_ids=[secure_file.pk for secure_file in files],
+        compression=compression,
+    )
+
+    def send():
+        from app_files.tasks import build_archive_task
+
+        build_archive_task.delay(archive.pk)
+
+    transaction.on_commit(send, robust=True)
+    return archive
+
+
+def build_archive(archive):
+    """
+    Write the ZIP of a pending FileArchive to storage and mark it ready.
+
+    The archive streams into storage as it is built: a multipart upload on
+    S3, holding a few parts in memory at most.
+    """
+    from app_files.models import FileArchive, SecureFile
+
+    files = SecureFile.objects.in_bulk(archive.file_ids)
+    # Files deleted since the request are left out
+    files = [files[pk] for pk in archive.file_ids if pk in files]
+    reader = ArchiveReader(iter_archive(files, archive.compression))
+    storage = archive.file.storage
+    name = storage.save(
+        get_archive_path(archive, ARCHIVE_FILENAME), File(reader, ARCHIVE_FILENAME)
+    )
+
+    archive.file.name = name
+    archive.size = reader.bytes_read
+    archive.status = FileArchive.Status.READY
+    archive.save(update_fields=["file", "size", "status", "dtm_updated"])
+    return archive
+
+
+def purge_expired_archives():
+    """
+    Delete archives older than SECURE_FILES_ARCHIVE_TTL_HOURS, with their objects.
+
+    Returns:
+        int: Number of archives deleted
+    """
+    from app_files.models import FileArchive
+
+    cutoff = timezone.now() - timedelta(hours=settings.SECURE_FILES_ARCHIVE_TTL_HOURS)
+    deleted, _ = FileArchive.objects.filter(dtm_created__lt=cutoff).delete()
+    return deleted
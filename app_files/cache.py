@@ -0,0 +1,141 @@
+import threading
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+
+PRESIGNED_URL_CACHE_ALIAS = "presigned_urls"
+DISPOSITION_TYPES = ("attachment", "inline")
+
+
+class PresignedURLCache:
+    """
+    Optional cache of presigned download URLs.
+
+    URLs are keyed by (slug, disposition, content_type) and kept for a fraction
+    of their expiration, so a cached URL always has at least
+    ``(1 - ttl_fraction) * expiration`` seconds of lifetime left when it is
+    handed out. The cache is enabled by defining the ``presigned_urls`` alias
+    in ``CACHES`` (Redis or local memory). Hit and miss counters are kept per
+    process and are available through ``stats()``.
+    """
+
+    def __init__(self, alias=PRESIGNED_URL_CACHE_ALIAS):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.alias in settings.CACHES
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def ttl_fraction(self):
+        return getattr(settings, "PRESIGNED_URL_CACHE_TTL_FRACTION", 0.5)
+
+    def make_key(self, slug, disposition_type, content_type):
+        return f"presigned-url:{slug}:{disposition_type}:{quote(content_type or '')}"
+
+    def _record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _is_fresh(self, entry, expiration, now):
+        # Reject URLs signed with a shorter expiration than the caller needs
+        return entry is not None and entry[1] - now >= expiration * (
+            1 - self.ttl_fraction
+        )
+
+    def get_many(self, files, expiration, disposition_type):
+        """Return a mapping of file pk to cached URL for the files that hit."""
+        if not self.enabled or not files:
+            return {}
+
+        keys = {
+            self.make_key(f.slug, disposition_type, f.content_type): f for f in files
+        }
+        entries = self.cache.get_many(list(keys))
+        now = time.time()
+        urls = {
+            keys[key].pk: entry[0]
+            for key, entry in entries.items()
+            if self._is_fresh(entry, expiration, now)
+        }
+        self._record(len(urls), len(keys) - len(urls))
+        return urls
+
+    def set_many(self, files, urls, expiration, disposition_type):
+        """Cache freshly signed URLs, given as a mapping of file pk to URL."""
+        if not self.enabled or not urls:
+            return
+
+        expires_at = time.time() + expiration
+        self.cache.set_many(
+            {
+                self.make_key(f.slug, disposition_type, f.content_type): (
+                    urls[f.pk],
+                    expires_at,
+                )
+                for f in files
+                if urls.get(f.pk)
+            },
+            timeout=int(expiration * self.ttl_fraction),
+        )
+
+    def get_or_sign(self, secure_file, expiration, disposition_type, sign):
+        """Return the cached URL for one file, calling ``sign()`` on a miss."""
+        if not self.enabled or secure_file.pk is None:
+            return sign()
+
+        urls = self.get_many([secure_file], expiration, disposition_type)
+        if secure_file.pk in urls:
+            return urls[secure_file.pk]
+
+        url = sign()
+        self.set_many(
+            [secure_file], {secure_file.pk: url}, expiration, disposition_type
+        )
+        return url
+
+    def invalidate(self, secure_file):
+        """Drop every cached URL of a file."""
+        self.invalidate_many([secure_file])
+
+    def invalidate_many(self, files):
+        """Drop every cached URL of many files with one cache round trip."""
+        if not self.enabled or not files:
+            return
+
+        self.cache.delete_many(
+            [
+                self.make_key(
+                    secure_file.slug, disposition_type, secure_file.content_type
+                )
+                for secure_file in files
+                for disposition_type in DISPOSITION_TYPES
+            ]
+        )
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+presigned_url_cache = PresignedURLCache()
@@ -0,0 +1,171 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
+
+# Process-wide registry of boto3 sessions, clients and resources.
+#
+# Building a boto3 client loads the endpoint and service models and resolves
+# credentials, which costs tens of milliseconds. Clients are thread-safe, so a
+# single client per (region, credentials, endpoint, config) is shared by every
+# thread in the process. Resources are not thread-safe, so they are cached per
+# thread on top of the shared session. Everything is dropped after a fork so a
+# gunicorn worker never reuses the connection pool of its master process.
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+_local = threading.local()
+_default_configs = {}
+
+
+def _reset_after_fork():
+    """Forget every cached object in a freshly forked child process."""
+    global _lock, _local
+    _lock = threading.Lock()
+    _local = threading.local()
+    _sessions.clear()
+    _clients.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_boto3_session(access_key=None, secret_key=None, session_token=None):
+    """
+    Return the shared boto3 session for the given credentials.
+
+    Passing no credentials returns a session that uses the default
+    credential chain (environment, instance profile, ...).
+    """
+    key = (access_key, secret_key, session_token)
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = boto3.Session(
+                    aws_access_key_id=access_key,
+                    aws_secret_access_key=secret_key,
+                    aws_session_token=session_token,
+                )
+                _sessions[key] = session
+    return session
+
+
+def get_s3_client(
+    region_name=None,
+    access_key=None,
+    secret_key=None,
+    session_token=None,
+    endpoint_url=None,
+    config=None,
+):
+    """
+    Return the shared S3 client for the given region and credentials.
+
+    The client is created on first use and reused by every later call with
+    the same arguments. ``config`` is compared by identity, so callers should
+    pass a long-lived ``botocore.config.Config`` instance.
+    """
+    key = (region_name, access_key, secret_key, session_token, endpoint_url, config)
+    client = _clients.get(key)
+    if client is None:
+        session = get_boto3_session(access_key, secret_key, session_token)
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = session.client(
+                    "s3",
+                    region_name=region_name,
+                    endpoint_url=endpoint_url,
+                    config=config,
+                )
+                _clients[key] = client
+    return client
+
+
+def get_s3_resource(
+    region_name=None,
+    access_key=None,
+    secret_key=None,
+    session_token=None,
+    endpoint_url=None,
+    config=None,
+    **kwargs,
+):
+    """
+    Return an S3 resource for the calling thread.
+
+    boto3 resources must not be shared between threads, so one is kept per
+    thread and per set of arguments, all built from the shared session.
+    Sessions are not thread-safe either, so the resource is built under the
+    registry lock; only its first use in each thread pays for it.
+    """
+    resources = getattr(_local, "resources", None)
+    if resources is None:
+        resources = _local.resources = {}
+
+    key = (
+        region_name,
+        access_key,
+        secret_key,
+        session_token,
+        endpoint_url,
+        config,
+        tuple(sorted(kwargs.items())),
+    )
+    resource = resources.get(key)
+    if resource is None:
+        session = get_boto3_session(access_key, secret_key, session_token)
+        with _lock:
+            resource = session.resource(
+                "s3",
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=config,
+                **kwargs,
+            )
+        resources[key] = resource
+    return resource
+
+
+def get_default_client_config():
+    """Return the shared client config built from the S3 settings."""
+    signature_version = getattr(settings, "AWS_S3_SIGNATURE_VERSION", None)
+    config = _default_configs.get(signature_version)
+    if config is None:
+        config = _default_configs.setdefault(
+            signature_version, Config(signature_version=signature_version)
+        )
+    return config
+
+
+def get_default_boto3_session():
+    """Return the shared boto3 session for the credentials in the settings."""
+    return get_boto3_session(
+        access_key=getattr(settings, "AWS_ACCESS_KEY_ID", None),
+        secret_key=getattr(settings, "AWS_SECRET_ACCESS_KEY", None),
+    )
+
+
+def get_default_s3_client():
+    """Return the shared S3 client configured from the project settings."""
+    return get_s3_client(
+        region_name=getattr(settings, "AWS_S3_REGION_NAME", None),
+        access_key=getattr(settings, "AWS_ACCESS_KEY_ID", None),
+        secret_key=getattr(settings, "AWS_SECRET_ACCESS_KEY", None),
+        endpoint_url=getattr(settings, "AWS_S3_ENDPOINT_URL", None),
+        config=get_default_client_config(),
+    )
+
+
+def clear_s3_clients():
+    """Drop every cached session, client and resource in this process."""
+    global _local
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
+        _local = threading.local()
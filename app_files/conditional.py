@@ -0,0 +1,61 @@
+import hashlib
+import time
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+# File responses embed presigned URLs valid for 300 seconds, possibly reused
+# from the presigned URL cache. Validators change at least this often, so a
+# client answered with 304 never holds URLs about to expire.
+VALIDATOR_INTERVAL = 60
+
+
+def get_url_epoch():
+    return int(time.time() // VALIDATOR_INTERVAL)
+
+
+def make_etag(request, *parts):
+    """
+    Build an ETag from the state of the data and the request it answers.
+
+    The requesting user and the full path (cursor, page size, search, ...)
+    are part of it, as is the current URL epoch.
+    """
+    key = "|".join(
+        str(part)
+        for part in (request.user.pk, request.get_full_path(), get_url_epoch(), *parts)
+    )
+    return f'"{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def get_list_etag(request, queryset):
+    """
+    ETag of a list of files, from one aggregate query.
+
+    ``MAX(dtm_updated)`` moves on every insert and update, and the count on
+    every delete. With the ``(uploaded_by, upload_status, dtm_updated,
+    expires_at)`` index both come from the index alone, expired files
+    included.
+    """
+    state = queryset.aggregate(last_updated=Max("dtm_updated"), count=Count("pk"))
+    return make_etag(request, state["last_updated"], state["count"])
+
+
+def get_object_validators(request, instance):
+    """Return the (ETag, Last-Modified timestamp) of a single file."""
+    last_modified = max(
+        int(instance.dtm_updated.timestamp()),
+        get_url_epoch() * VALIDATOR_INTERVAL,
+    )
+    return make_etag(request, instance.pk, instance.dtm_updated), last_modified
+
+
+def set_validators(response, etag, last_modified=None):
+    """Add the validators to a response, which clients must always revalidate."""
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    patch_vary_headers(response, ["Authorization"])
+    return response
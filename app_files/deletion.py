@@ -0,0 +1,119 @@
+import threading
+import weakref
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.db import transaction
+
+from app_files.clients import get_default_s3_client
+from app_files.storage import SecureFileStorage, get_secure_file_storage
+
+# S3 DeleteObjects accepts at most 1000 keys per request
+DELETE_OBJECTS_BATCH_SIZE = 1000
+
+# Per-thread deletion batches waiting for their transaction to commit
+_pending = threading.local()
+
+
+def get_storage_key(name):
+    """Return the S3 key of a stored file name, including the storage location."""
+    location = SecureFileStorage.location
+    return f"{location}/{name}" if location else name
+
+
+def delete_stored_files(names):
+    """
+    Delete stored files with S3 DeleteObjects, up to 1000 keys per request.
+
+    Local files (USE_S3 off) are deleted one by one. Duplicate names are
+    coalesced. Returns the names that could not be
+    deleted, so the caller can retry them.
+    """
+    names = [name for name in dict.fromkeys(names) if name]
+    if not getattr(settings, "USE_S3", False):
+        return _delete_local_files(names)
+
+    keys = {get_storage_key(name): name for name in names}
+    if not keys:
+        return []
+
+    s3_client = get_default_s3_client()
+    failed = []
+    key_list = list(keys)
+    for start in range(0, len(key_list), DELETE_OBJECTS_BATCH_SIZE):
+        batch = key_list[start : start + DELETE_OBJECTS_BATCH_SIZE]
+        try:
+            response = s3_client.delete_objects(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        except (BotoCoreError, ClientError) as e:
+            print(f"Error deleting {len(batch)} objects: {e}")
+            failed.extend(keys[key] for key in batch)
+            continue
+
+        for error in response.get("Errors", []):
+            print(f"Error deleting {error['Key']}: {error.get('Message')}")
+            failed.append(keys[error["Key"]])
+    return failed
+
+
+def _delete_local_files(names):
+    storage = get_secure_file_storage()
+    failed = []
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError as e:
+            print(f"Error deleting {name}: {e}")
+            failed.append(name)
+    return failed
+
+
+def _send(names):
+    from app_files.tasks import delete_stored_files_task
+
+    delete_stored_files_task.delay(names)
+
+
+class _DeletionBatch:
+    """Names scheduled for deletion at one savepoint level, sent on commit."""
+
+    def __init__(self):
+        self.names = []
+
+    def __call__(self):
+        _send(self.names)
+
+
+def schedule_deletion(names):
+    """
+    Delete stored files in the background once the current transaction commits.
+
+    Every name scheduled at the same savepoint level of a transaction is
+    sent to a single Celery task, so deleting many rows (a queryset delete,
+    a bulk delete) queues one message. Nothing is sent if the transaction,
+    or the savepoint the names were scheduled in, is rolled back.
+    """
+    names = [name for name in names if name]
+    if not names:
+        return
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _send(names)
+        return
+
+    # Only Django's on-commit queue holds a batch strongly. A rollback drops
+    # it from the queue, which frees it and removes it from _pending, so
+    # the next names start a new batch.
+    batches = getattr(_pending, "batches", None)
+    if batches is None:
+        batches = _pending.batches = weakref.WeakValueDictionary()
+    key = (connection.alias, *connection.savepoint_ids)
+    batch = batches.get(key)
+    if batch is None:
+        batch = batches[key] = _DeletionBatch()
+        # A broker outage must not fail a request whose rows are already gone
+        transaction.on_commit(batch, robust=True)
+    batch.names.extend(names)
@@ -0,0 +1,196 @@
+import io
+import os
+
+import redis
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from app_files.access import get_redis_client
+
+# Originals that get thumbnail and preview derivatives
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+DERIVATIVE_CONTENT_TYPE = "image/jpeg"
+DERIVATIVE_QUALITY = 85
+# Polls of a file with pending derivatives requeue them at most this often
+REQUEUE_KEY_PREFIX = "secure_files:derivatives:"
+REQUEUE_INTERVAL = 300
+
+
+def is_image(name):
+    return bool(name) and os.path.splitext(name.lower())[1] in IMAGE_EXTENSIONS
+
+
+def get_derivative_name(name, variant):
+    """Derivatives are stored next to the original, e.g. ``<name>.thumbnail.jpg``."""
+    return f"{name}.{variant}.jpg"
+
+
+def is_derivative_of(name, original):
+    """Tell whether a stored name is a derivative of the original's name."""
+    return bool(original) and any(
+        name == get_derivative_name(original, variant)
+        for variant in settings.SECURE_FILES_DERIVATIVE_SIZES
+    )
+
+
+def get_original_name(name):
+    """Return the name of the original a derivative name belongs to, or None."""
+    for variant in settings.SECURE_FILES_DERIVATIVE_SIZES:
+        suffix = f".{variant}.jpg"
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[: -len(suffix)]
+    return None
+
+
+def get_derivative_names(names):
+    """
+    Return the given stored names followed by the names of their derivatives.
+
+    Used when scheduling deletions, so derivatives go with their original.
+    Names that never had derivatives just cost a no-op delete.
+    """
+    names = list(names)
+    return names + [
+        get_derivative_name(name, variant)
+        for name in names
+        if is_image(name)
+        for variant in settings.SECURE_FILES_DERIVATIVE_SIZES
+    ]
+
+
+def get_pending_sizes(secure_file):
+    """Return the configured sizes that are missing or outdated on a file."""
+    if not is_image(secure_file.file.name):
+        return {}
+    return {
+        variant: size
+        for variant, size in settings.SECURE_FILES_DERIVATIVE_SIZES.items()
+        if (secure_file.derivatives or {}).get(variant, {}).get("size") != list(size)
+    }
+
+
+def render_derivatives(file, sizes):
+    """
+    Render JPEG derivatives of an image, largest first.
+
+    Each size is resized from the previous one rather than from the
+    original, and JPEGs are decoded at a reduced scale when possible.
+
+    Args:
+        file: Open file object of the original image
+        sizes (dict): Mapping of variant name to maximum (width, height)
+
+    Returns:
+        dict: Mapping of variant name to a (bytes, width, height) tuple
+    """
+    ordered = sorted(sizes.items(), key=lambda item: item[1][0] * item[1][1])
+    with Image.open(file) as original:
+        largest = max(ordered[-1][1])
+        # Either orientation, EXIF rotation is applied after decoding
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ("RGBA", "LA", "P"):
+            # JPEG has no alpha channel, flatten onto white
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        rendered = {}
+        for variant, size in reversed(ordered):
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=DERIVATIVE_QUALITY, optimize=True)
+            rendered[variant] = (buffer.getvalue(), image.width, image.height)
+        return rendered
+
+
+def generate_derivatives(secure_file):
+    """
+    Create the missing derivatives of a file and record them on the model.
+
+    Idempotent: sizes already recorded are skipped, and derivatives made for
+    another file sharing the same stored object are reused. The record is
+    written to every file sharing the object.
+
+    Returns:
+        bool: Whether anything was generated or reused
+    """
+    from app_files.models import SecureFile
+
+    sizes = get_pending_sizes(secure_file)
+    if not sizes:
+        return False
+
+    name = secure_file.file.name
+    derivatives = dict(secure_file.derivatives or {})
+    # Files sharing the stored object share its blob
+    if secure_file.blob_id:
+        sharing = SecureFile.objects.filter(blob_id=secure_file.blob_id)
+    else:
+        sharing = SecureFile.objects.filter(pk=secure_file.pk)
+    shared = sharing.exclude(pk=secure_file.pk).values_list("derivatives", flat=True)
+    for recorded in shared:
+        for variant, size in list(sizes.items()):
+            if (recorded or {}).get(variant, {}).get("size") == list(size):
+                derivatives[variant] = recorded[variant]
+                del sizes[variant]
+
+    if sizes:
+        storage = secure_file.file.storage
+        with storage.open(name, "rb") as file:
+            rendered = render_derivatives(file, sizes)
+        for variant, (data, width, height) in rendered.items():
+            derivative_name = get_derivative_name(name, variant)
+            # Regenerated sizes replace the previous object under the same name
+            storage.delete(derivative_name)
+            derivatives[variant] = {
+                "name": storage.save(derivative_name, ContentFile(data)),
+                "width": width,
+                "height": height,
+                "size": list(sizes[variant]),
+            }
+
+    sharing.update(derivatives=derivatives)
+    secure_file.derivatives = derivatives
+    return True
+
+
+def schedule_derivatives(files):
+    """Generate derivatives of complete image files once the transaction commits."""
+    file_ids = [
+        secure_file.pk
+        for secure_file in files
+        if secure_file.upload_status == secure_file.UploadStatus.COMPLETE
+        and get_pending_sizes(secure_file)
+    ]
+    if not file_ids:
+        return
+
+    def send():
+        from app_files.tasks import generate_derivatives_task
+
+        generate_derivatives_task.delay(file_ids)
+
+    # A broker outage must not fail the upload, derivatives can be regenerated
+    transaction.on_commit(send, robust=True)
+
+
+def requeue_derivatives(secure_file):
+    """
+    Queue the derivatives of a file again, e.g. when its task was lost.
+
+    Polls of a pending file queue at most one task per REQUEUE_INTERVAL.
+    """
+    try:
+        if not get_redis_client().set(
+            f"{REQUEUE_KEY_PREFIX}{secure_file.pk}", 1, nx=True, ex=REQUEUE_INTERVAL
+        ):
+            return
+    except redis.RedisError as e:
+        print(f"Error deduplicating derivatives of {secure_file.slug}: {e}")
+    schedule_derivatives([secure_file])
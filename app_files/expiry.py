@@ -0,0 +1,50 @@
+import time
+
+from django.db.models import Q
+from django.utils import timezone
+
+from app_files.models import SecureFile
+
+PURGE_CHUNK_SIZE = 500
+# A run stops starting new chunks after this many seconds
+PURGE_MAX_SECONDS = 240
+
+
+def purge_expired_files(chunk_size=PURGE_CHUNK_SIZE, max_seconds=PURGE_MAX_SECONDS):
+    """
+    Delete the files whose ``expires_at`` has passed, with their objects.
+
+    Expired rows are read in ``(expires_at, pk)`` order, ``chunk_size`` at a
+    time, and each chunk is removed with ``bulk_delete()`` in its own
+    transaction. Its objects are then deleted with DeleteObjects by the
+    deletion task, shared objects only with their last reference. The run
+    stops after ``max_seconds``, the next one continues from there.
+
+    Returns:
+        int: Number of files purged
+    """
+    now = timezone.now()
+    deadline = time.monotonic() + max_seconds
+    queryset = SecureFile.objects.filter(expires_at__lte=now).order_by(
+        "expires_at", "pk"
+    )
+
+    purged = 0
+    after = None
+    while time.monotonic() < deadline:
+        chunk = queryset
+        if after is not None:
+            chunk = chunk.filter(
+                Q(expires_at__gt=after[0]) | Q(expires_at=after[0], pk__gt=after[1])
+            )
+        rows = list(chunk.values_list("expires_at", "pk")[:chunk_size])
+        if not rows:
+            break
+        after = rows[-1]
+
+        # Expiries pushed back meanwhile are checked again under the row lock
+        deleted, _ = SecureFile.objects.filter(
+            pk__in=[pk for _, pk in rows], expires_at__lte=now
+        ).bulk_delete()
+        purged += deleted
+    return purged
@@ -0,0 +1,306 @@
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    SkipFile,
+    StopFutureHandlers,
+)
+from rest_framework.exceptions import ValidationError
+
+from app_files.clients import get_default_s3_client
+from app_files.models import (
+    ALLOWED_EXTENSIONS,
+    MAX_FILE_SIZE,
+    SecureFile,
+    get_extension,
+    get_file_path,
+    matches_signature,
+)
+from app_files.uploads import MULTIPART_PART_SIZE
+
+# Parts uploaded in parallel per request; bounds buffered memory to
+# (MAX_PARTS_IN_FLIGHT + 1) * MULTIPART_PART_SIZE.
+MAX_PARTS_IN_FLIGHT = 4
+
+
+class ContentValidationUploadHandler(FileUploadHandler):
+    """
+    Validate uploaded files as they stream in, before any handler stores them.
+
+    The extension is checked when a file starts, its first chunk against the
+    magic bytes of that type, and the size limit as bytes arrive. A bad file
+    is rejected before the rest of it is read, spooled or sent to S3. Must
+    be the first upload handler.
+
+    By default a rejection fails the request with a ValidationError. With
+    ``skip_rejected`` the file is skipped instead, the other files of the
+    request go on, and the rejection is recorded in ``rejected`` as an
+    (index, filename, message) tuple.
+    """
+
+    def __init__(self, request=None, field_name="file", skip_rejected=False):
+        super().__init__(request)
+        self.field_name = field_name
+        self.skip_rejected = skip_rejected
+        self.active = False
+        self.index = -1
+        self.size = 0
+        self.error = None
+        self.rejected = []
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        # A single file plus the form fields cannot exceed this
+        limit = MAX_FILE_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        if not self.skip_rejected and content_length and content_length > limit:
+            raise ValidationError({"file": ["File size cannot exceed 100MB."]})
+
+    def reject(self, message):
+        self.active = False
+        if not self.skip_rejected:
+            raise ValidationError({"file": [message]})
+        self.rejected.append((self.index, self.file_name, message))
+        raise SkipFile()
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name == self.field_name
+        if not self.active:
+            return
+
+        self.index += 1
+        self.size = 0
+        # Rejected with the first chunk: skipping a file before the next
+        # handlers have opened theirs would close the previous file
+        self.error = None
+        if get_extension(self.file_name) not in ALLOWED_EXTENSIONS:
+            self.error = "File type not supported."
+        elif self.content_length and self.content_length > MAX_FILE_SIZE:
+            self.error = "File size cannot exceed 100MB."
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        if start == 0:
+            if self.error:
+                self.reject(self.error)
+            if not matches_signature(get_extension(self.file_name), raw_data):
+                self.reject("File content does not match its type.")
+        self.size += len(raw_data)
+        if self.size > MAX_FILE_SIZE:
+            self.reject("File size cannot exceed 100MB.")
+        return raw_data
+
+    def file_complete(self, file_size):
+        # The next handler provides the file
+        self.active = False
+        return None
+
+
+class S3StreamedFile(UploadedFile):
+    """
+    An uploaded file whose bytes are already stored in S3.
+
+    Returned by ``S3MultipartUploadHandler`` instead of a temporary file. It
+    carries the slug and storage name the object was written under, so the
+    SecureFile row can be saved without uploading the content again.
+    """
+
+    def __init__(self, name, content_type, size, charset, slug, storage_name, sha256):
+        super().__init__(
+            file=None, name=name, content_type=content_type, size=size, charset=charset
+        )
+        self.slug = slug
+        self.storage_name = storage_name
+        self.sha256 = sha256
+
+    def open(self, mode=None):
+        raise ValueError("The content of a streamed upload lives in S3 only.")
+
+
+class S3MultipartUploadHandler(FileUploadHandler):
+    """
+    Stream the ``file`` field of a multipart request straight into S3.
+
+    Incoming chunks are buffered into parts that are uploaded concurrently
+    while the rest of the request is still being received, so nothing is
+    spooled to a temporary file. Size and SHA-256 are computed on the fly.
+    Files smaller than one part are stored with a single PutObject. Call
+    ``abort()`` if the request fails after parsing started; it removes the
+    multipart upload or the stored object.
+    """
+
+    field_name = "file"
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.s3_client = None
+        self.secure_file = None
+        self.upload_id = None
+        self.buffer = bytearray()
+        self.part_number = 0
+        self.parts = []
+        self.futures = set()
+        self.executor = None
+        self.size = 0
+        self.sha256 = None
+        self.stored = False
+
+    @classmethod
+    def is_enabled(cls):
+        return bool(getattr(settings, "AWS_STORAGE_BUCKET_NAME", None))
+
+    @property
+    def bucket_name(self):
+        return settings.AWS_STORAGE_BUCKET_NAME
+
+    @property
+    def key(self):
+        return self.secure_file.get_storage_key()
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name != self.field_name or self.secure_file is not None:
+            # Leave other fields to the default handlers
+            return
+
+        self.s3_client = get_default_s3_client()
+        self.secure_file = SecureFile()
+        self.secure_file.slug = self.secure_file.generate_slug()
+        self.secure_file.file.name = get_file_path(self.secure_file, self.file_name)
+        self.sha256 = hashlib.sha256()
+        raise StopFutureHandlers()
+
+    def _object_parameters(self):
+        storage = self.secure_file.file.storage
+        params = storage.get_object_parameters(self.key)
+        params["ContentType"] = self.content_type
+        if storage.default_acl:
+            params["ACL"] = storage.default_acl
+        return params
+
+    def _upload_part(self, part_number, body):
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def _collect(self, futures):
+        for future in futures:
+            self.futures.discard(future)
+            # Re-raises the S3 error of a failed part
+            self.parts.append(future.result())
+
+    def _submit_part(self, body):
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key, **self._object_parameters()
+            )
+            self.upload_id = response["UploadId"]
+            self.executor = ThreadPoolExecutor(max_workers=MAX_PARTS_IN_FLIGHT)
+
+        if len(self.futures) >= MAX_PARTS_IN_FLIGHT:
+            done, _ = wait(self.futures, return_when=FIRST_COMPLETED)
+            self._collect(done)
+
+        self.part_number += 1
+        self.futures.add(
+            self.executor.submit(self._upload_part, self.part_number, body)
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.secure_file is None or self.stored:
+            return raw_data
+
+        self.size += len(raw_data)
+        self.sha256.update(raw_data)
+        self.buffer.extend(raw_data)
+        try:
+            while len(self.buffer) >= MULTIPART_PART_SIZE:
+                body = bytes(self.buffer[:MULTIPART_PART_SIZE])
+                del self.buffer[:MULTIPART_PART_SIZE]
+                self._submit_part(body)
+        except (BotoCoreError, ClientError):
+            self.abort()
+            raise
+        return None
+
+    def file_complete(self, file_size):
+        if self.secure_file is None or self.stored:
+            return None
+
+        try:
+            if self.upload_id is None:
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    Body=bytes(self.buffer),
+                    **self._object_parameters(),
+                )
+            else:
+                if self.buffer:
+                    self._submit_part(bytes(self.buffer))
+                self._collect(list(self.futures))
+                self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    MultipartUpload={
+                        "Parts": sorted(self.parts, key=lambda p: p["PartNumber"])
+                    },
+                )
+                self.upload_id = None
+        except (BotoCoreError, ClientError):
+            self.abort()
+            raise
+        finally:
+            self.buffer = bytearray()
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+
+        self.stored = True
+        return S3StreamedFile(
+            name=self.file_name,
+            content_type=self.content_type,
+            size=self.size,
+            charset=self.charset,
+            slug=self.secure_file.slug,
+            storage_name=self.secure_file.file.name,
+            sha256=self.sha256.hexdigest(),
+        )
+
+    def upload_interrupted(self):
+        self.abort()
+
+    def abort(self):
+        """Discard whatever this handler has written to S3 so far."""
+        if self.secure_file is None:
+            return
+
+        if self.executor is not None:
+            for future in self.futures:
+                future.cancel()
+            self.executor.shutdown(wait=True)
+            self.futures = set()
+
+        try:
+            if self.upload_id is not None:
+                self.s3_client.abort_multipart_upload(
+                    Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id
+                )
+                self.upload_id = None
+            elif self.stored:
+                self.s3_client.delete_object(Bucket=self.bucket_name, Key=self.key)
+                self.stored = False
+        except (BotoCoreError, ClientError) as e:
+            print(f"Error aborting streamed upload: {e}")
@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from app_files.models import SecureFile, hash_stored_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute content hashes for stored files and share the storage of duplicates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of files downloaded and hashed in parallel (default: 8).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of files loaded from the database at a time (default: 100).",
+        )
+
+    def handle(self, *args, **options):
+        queryset = SecureFile.objects.filter(
+            content_hash__isnull=True,
+            upload_status=SecureFile.UploadStatus.COMPLETE,
+        ).order_by("pk")
+
+        hashed = deduplicated = failed = 0
+        last_pk = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[: options["batch_size"]])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                # Only the downloads run in the pool, rows are updated here
+                for secure_file, content_hash in zip(
+                    batch, executor.map(hash_stored_file, batch)
+                ):
+                    if content_hash is None:
+                        failed += 1
+                        continue
+                    name = secure_file.file.name
+                    secure_file.attach_blob(content_hash)
+                    hashed += 1
+                    if secure_file.file.name != name:
+                        deduplicated += 1
+
+                self.stdout.write(f"Hashed {hashed} files...")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Hashed {hashed} files, deduplicated {deduplicated}, failed {failed}."
+            )
+        )
@@ -0,0 +1,88 @@
+import time
+
+import boto3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app_files.clients import clear_s3_clients, get_default_client_config
+from app_files.models import SecureFile
+
+
+def build_sample_file():
+    """Build an unsaved SecureFile pointing at a representative key."""
+    return SecureFile(
+        slug="aBcDeFgHiJkL",
+        file="2025/01/aBcDeFgHiJkL.pdf",
+        original_filename="quarterly report.pdf",
+        content_type="application/pdf",
+        file_size=1024,
+    )
+
+
+def sign_with_new_client(secure_file):
+    """Sign a URL the way generate_presigned_url did before the client registry."""
+    s3_client = boto3.client(
+        "s3",
+        region_name=settings.AWS_S3_REGION_NAME,
+        aws_access_key_id=getattr(settings, "AWS_ACCESS_KEY_ID", None),
+        aws_secret_access_key=getattr(settings, "AWS_SECRET_ACCESS_KEY", None),
+        config=get_default_client_config(),
+    )
+    return s3_client.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": settings.AWS_STORAGE_BUCKET_NAME,
+            "Key": f"{secure_file.file.storage.location}/{secure_file.file.name}",
+            "ResponseContentDisposition": f'inline; filename="{secure_file.original_filename}"',
+            "ResponseContentType": secure_file.content_type,
+        },
+        ExpiresIn=300,
+    )
+
+
+def sign_with_shared_client(secure_file):
+    # Signs every time: generate_presigned_url() would serve cache hits
+    return secure_file._sign_presigned_url(300, "inline")
+
+
+class Command(BaseCommand):
+    help = "Compare presigned URLs per second with a new S3 client per call and with the shared client registry."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Number of URLs to sign per variant (default: 200).",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "AWS_STORAGE_BUCKET_NAME", None):
+            raise CommandError("S3 is not configured, set USE_S3=True.")
+
+        iterations = options["iterations"]
+        if iterations < 1:
+            raise CommandError("--iterations must be at least 1.")
+
+        secure_file = build_sample_file()
+        clear_s3_clients()
+
+        results = {}
+        for label, sign in (
+            ("new client per call", sign_with_new_client),
+            ("shared client", sign_with_shared_client),
+        ):
+            # Warm up imports and the registry so only steady-state cost is measured
+            sign(secure_file)
+            started = time.perf_counter()
+            for _ in range(iterations):
+                sign(secure_file)
+            elapsed = time.perf_counter() - started
+            results[label] = iterations / elapsed
+            self.stdout.write(
+                f"{label:>20}: {results[label]:10.1f} URLs/s "
+                f"({elapsed / iterations * 1000:.3f} ms/URL)"
+            )
+
+        speedup = results["shared client"] / results["new client per call"]
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {speedup:.1f}x"))
@@ -0,0 +1,250 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from app_files.cache import presigned_url_cache
+from app_files.clients import get_default_s3_client
+from app_files.deletion import delete_stored_files, get_storage_key
+from app_files.derivatives import get_derivative_name
+from app_files.models import FileBlob, SecureFile, get_hashed_name, is_hashed_name
+from app_files.tasks import delete_unreferenced_files_task
+from app_files.tiering import STANDARD
+
+
+def copy_object(source, target, storage_class=STANDARD):
+    # CopyObject writes STANDARD unless told otherwise, which would undo tiering
+    get_default_s3_client().copy_object(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=get_storage_key(target),
+        CopySource={
+            "Bucket": settings.AWS_STORAGE_BUCKET_NAME,
+            "Key": get_storage_key(source),
+        },
+        MetadataDirective="COPY",
+        StorageClass=storage_class,
+    )
+
+
+def copy_to_hashed_name(item):
+    """
+    Copy a stored file and its derivatives to the hashed layout, server-side.
+
+    The file keeps the storage class recorded on its rows; derivatives are
+    never tiered.
+
+    Returns:
+        tuple: (old name, new name, new derivatives), the new name is None if
+        the file could not be copied. Derivatives that could not be copied
+        are left out and get regenerated.
+    """
+    name, (derivatives, storage_class) = item
+    new_name = get_hashed_name(name)
+    try:
+        copy_object(name, new_name, storage_class)
+    except (BotoCoreError, ClientError) as e:
+        print(f"Error copying {name}: {e}")
+        return name, None, None
+
+    new_derivatives = {}
+    for variant, derivative in derivatives.items():
+        target = get_derivative_name(new_name, variant)
+        try:
+            copy_object(derivative["name"], target)
+        except (BotoCoreError, ClientError) as e:
+            print(f"Error copying {derivative['name']}: {e}")
+            continue
+        new_derivatives[variant] = {**derivative, "name": target}
+    return name, new_name, new_derivatives
+
+
+class Command(BaseCommand):
+    help = (
+        "Move stored objects to the hashed key layout with server-side copies "
+        "and rename their SecureFiles in batches. Safe to run under live "
+        "traffic and to resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=16,
+            help="Number of objects copied in parallel (default: 16).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Files read and renamed per transaction (default: 500).",
+        )
+        parser.add_argument(
+            "--after-pk",
+            type=int,
+            default=0,
+            help="Resume after this SecureFile pk (a checkpoint printed by a "
+            "previous run).",
+        )
+        parser.add_argument(
+            "--delete-after",
+            type=int,
+            default=600,
+            help="Seconds old objects are kept for URLs already handed out "
+            "(default: 600).",
+        )
+        parser.add_argument(
+            "--keep-old",
+            action="store_true",
+            help="Leave old objects in place, for reconcile_storage --purge-objects.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the objects that would move.",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "AWS_STORAGE_BUCKET_NAME", None):
+            raise CommandError("S3 is not configured, set USE_S3=True.")
+
+        self.options = options
+        # Pending uploads are still being written to their key
+        queryset = (
+            SecureFile.objects.filter(upload_status=SecureFile.UploadStatus.COMPLETE)
+            .order_by("pk")
+            .only("pk", "slug", "file", "content_type", "derivatives", "storage_class")
+        )
+
+        moved = failed = 0
+        last_pk = options["after_pk"]
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[: options["batch_size"]])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                # Files sharing a blob share a name, its derivatives and its
+                # storage class
+                names = {}
+                for secure_file in batch:
+                    name = secure_file.file.name
+                    if name and not is_hashed_name(name):
+                        names.setdefault(
+                            name,
+                            (secure_file.derivatives or {}, secure_file.storage_class),
+                        )
+                if names and options["dry_run"]:
+                    moved += len(names)
+                elif names:
+                    copies = [
+                        copy
+                        for copy in executor.map(copy_to_hashed_name, names.items())
+                        if copy[1] is not None
+                    ]
+                    moved += self.rename(batch, names, copies)
+                    failed += len(names) - len(copies)
+
+                self.stdout.write(f"Moved {moved} objects, checkpoint: {last_pk}")
+
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {moved} objects, {failed} failed.")
+        )
+
+    def rename(self, batch, names, copies):
+        """
+        Point files at their copied objects, then drop the objects not used.
+
+        Uploads that reuse a stored object lock its blob before reading its
+        name, so once the renaming commits no new file can pick up an old
+        name. Only rows still on the name they were copied from are updated.
+
+        Args:
+            batch (list): SecureFiles the names were read from
+            names (dict): Old name -> (derivatives, storage class) before the copy
+            copies (list): (old name, new name, new derivatives) copied
+
+        Returns:
+            int: Number of objects moved
+        """
+        if not copies:
+            return 0
+        old_names = [name for name, _, _ in copies]
+        new_names = {name: new_name for name, new_name, _ in copies}
+        with transaction.atomic():
+            list(
+                FileBlob.objects.select_for_update()
+                .filter(file__in=old_names)
+                .values_list("pk", flat=True)
+            )
+            FileBlob.objects.filter(file__in=old_names).update(
+                file=Case(
+                    *[
+                        When(file=name, then=Value(new_names[name]))
+                        for name in old_names
+                    ],
+                    output_field=models.CharField(),
+                )
+            )
+            SecureFile.objects.filter(file__in=old_names).update(
+                file=Case(
+                    *[
+                        When(file=name, then=Value(new_names[name]))
+                        for name in old_names
+                    ],
+                    output_field=models.CharField(),
+                ),
+                derivatives=Case(
+                    *[
+                        When(
+                            file=name,
+                            then=Value(derivatives, models.JSONField()),
+                        )
+                        for name, _, derivatives in copies
+                    ],
+                    output_field=models.JSONField(),
+                ),
+                dtm_updated=timezone.now(),
+            )
+        presigned_url_cache.invalidate_many(
+            [secure_file for secure_file in batch if secure_file.file.name in new_names]
+        )
+
+        # Files deleted meanwhile leave their copy unused, and files written
+        # meanwhile keep their old object until the next run
+        in_use = set(
+            SecureFile.objects.filter(
+                file__in=[*old_names, *new_names.values()]
+            ).values_list("file", flat=True)
+        )
+        unused_copies = []
+        old_objects = []
+        for name, new_name, derivatives in copies:
+            if new_name not in in_use:
+                unused_copies.append(new_name)
+                unused_copies.extend(d["name"] for d in derivatives.values())
+            if name not in in_use:
+                old_objects.append(name)
+                old_objects.extend(d["name"] for d in names[name][0].values())
+        for name in delete_stored_files(unused_copies):
+            self.stderr.write(f"Could not delete unused copy: {name}")
+        if old_objects and not self.options["keep_old"]:
+            self.delete_later(old_objects)
+        return sum(new_name in in_use for new_name in new_names.values())
+
+    def delete_later(self, names):
+        # A full save() of a file read before the renaming may still write
+        # an old name back, so the names are checked again before deleting
+        try:
+            delete_unreferenced_files_task.apply_async(
+                args=[names], countdown=self.options["delete_after"]
+            )
+        except OperationalError as e:
+            # Left for reconcile_storage --purge-objects
+            self.stderr.write(f"Could not queue deletion of {len(names)} objects: {e}")
@@ -0,0 +1,227 @@
+import heapq
+from datetime import timedelta
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app_files.clients import get_default_s3_client
+from app_files.deletion import DELETE_OBJECTS_BATCH_SIZE, delete_stored_files
+from app_files.derivatives import get_original_name, is_derivative_of
+from app_files.models import FileArchive, SecureFile
+from app_files.storage import SecureFileStorage
+
+
+def iter_stored_objects(s3_client, prefix, start_after, page_size):
+    """Yield (name, last_modified) for every object under prefix, in key order."""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    pages = paginator.paginate(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Prefix=prefix,
+        StartAfter=f"{prefix}{start_after}" if start_after else "",
+        PaginationConfig={"PageSize": page_size},
+    )
+    for page in pages:
+        for obj in page.get("Contents", []):
+            yield obj["Key"][len(prefix) :], obj["LastModified"]
+
+
+def iter_file_names(start_after, chunk_size):
+    """
+    Yield (name, is_complete) for every distinct stored file name, in key order.
+
+    Rows are read in keyset-ordered chunks, so memory use does not depend on
+    the table size. Files sharing a blob share a name and are yielded once.
+    """
+    # "complete" sorts before "pending", so the first row of a name tells
+    # whether any of its files is complete. The file column is binary
+    # collated like S3 keys, so each chunk is a range of its index.
+    queryset = SecureFile.objects.order_by("file", "upload_status")
+    after = start_after or ""
+    while True:
+        rows = list(
+            queryset.filter(file__gt=after).values_list("file", "upload_status")[
+                :chunk_size
+            ]
+        )
+        for key, upload_status in rows:
+            if key != after:
+                after = key
+                yield key, upload_status == SecureFile.UploadStatus.COMPLETE
+        if len(rows) < chunk_size:
+            return
+
+
+def iter_archive_names(start_after, chunk_size):
+    """
+    Yield (name, False) for every stored FileArchive, in key order.
+
+    Archives share the storage of the files, so their objects are known
+    too. A missing archive object is not reported: archives are rebuilt on
+    request and purged after ARCHIVE_TTL_HOURS anyway.
+    """
+    queryset = FileArchive.objects.exclude(file="").order_by("file")
+    after = start_after or ""
+    while True:
+        keys = list(
+            queryset.filter(file__gt=after).values_list("file", flat=True)[:chunk_size]
+        )
+        for key in keys:
+            yield key, False
+        if len(keys) < chunk_size:
+            return
+        after = keys[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Find stored objects without a SecureFile or FileArchive and complete "
+        "SecureFiles without a stored object, optionally purging either side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--purge-objects",
+            action="store_true",
+            help="Delete stored objects that no SecureFile or FileArchive "
+            "refers to.",
+        )
+        parser.add_argument(
+            "--purge-rows",
+            action="store_true",
+            help="Delete complete SecureFiles whose object is missing.",
+        )
+        parser.add_argument(
+            "--start-after",
+            default="",
+            help="Resume after this file name (a checkpoint printed by a previous run).",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=86400,
+            help="Ignore objects modified less than this many seconds ago, "
+            "as their upload may not be committed yet (default: 86400).",
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=1000,
+            help="Keys listed from S3 and read from the database at a time "
+            "(default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "AWS_STORAGE_BUCKET_NAME", None):
+            raise CommandError("S3 is not configured, set USE_S3=True.")
+
+        self.purge_objects = options["purge_objects"]
+        self.purge_rows = options["purge_rows"]
+        self.orphan_objects = []
+        self.orphan_rows = []
+        self.counts = {"objects": 0, "rows": 0, "orphan_objects": 0, "orphan_rows": 0}
+
+        location = SecureFileStorage.location
+        prefix = f"{location}/" if location else ""
+        cutoff = timezone.now() - timedelta(seconds=options["min_age"])
+        page_size = options["page_size"]
+
+        objects = iter_stored_objects(
+            get_default_s3_client(), prefix, options["start_after"], page_size
+        )
+        names = heapq.merge(
+            iter_file_names(options["start_after"], page_size),
+            iter_archive_names(options["start_after"], page_size),
+            key=itemgetter(0),
+        )
+
+        # Merge-join of two streams sorted by name. Image derivatives
+        # ("<name>.<variant>.jpg") sort right after their original.
+        obj = next(objects, None)
+        row = next(names, None)
+        last_row_name = None
+        steps = 0
+        while obj is not None or row is not None:
+            if row is None or (obj is not None and obj[0] < row[0]):
+                name = obj[0]
+                self.counts["objects"] += 1
+                if obj[1] < cutoff and not self.has_original(name, last_row_name):
+                    self.found_orphan_object(name)
+                obj = next(objects, None)
+            elif obj is None or row[0] < obj[0]:
+                name = last_row_name = row[0]
+                self.counts["rows"] += 1
+                if row[1]:
+                    self.found_orphan_row(name)
+                row = next(names, None)
+            else:
+                name = last_row_name = obj[0]
+                self.counts["objects"] += 1
+                self.counts["rows"] += 1
+                obj = next(objects, None)
+                row = next(names, None)
+
+            steps += 1
+            if steps % page_size == 0:
+                self.checkpoint(name)
+
+        self.flush()
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Scanned {objects} objects and {rows} file names: "
+                "{orphan_objects} objects without a file, "
+                "{orphan_rows} files without an object.".format(**self.counts)
+            )
+        )
+
+    def has_original(self, name, last_row_name):
+        """
+        Tell whether a stored name is a derivative of an existing file.
+
+        Derivatives sort right after their original, so this is usually
+        answered by the last file name seen. Otherwise, e.g. right after
+        resuming from the checkpoint of the original, the original is
+        looked up.
+        """
+        if is_derivative_of(name, last_row_name):
+            return True
+        original = get_original_name(name)
+        return (
+            original is not None and SecureFile.objects.filter(file=original).exists()
+        )
+
+    def found_orphan_object(self, name):
+        self.counts["orphan_objects"] += 1
+        self.stdout.write(f"object-only: {name}")
+        if self.purge_objects:
+            self.orphan_objects.append(name)
+            if len(self.orphan_objects) >= DELETE_OBJECTS_BATCH_SIZE:
+                self.flush()
+
+    def found_orphan_row(self, name):
+        self.counts["orphan_rows"] += 1
+        self.stdout.write(f"row-only: {name}")
+        if self.purge_rows:
+            self.orphan_rows.append(name)
+            if len(self.orphan_rows) >= DELETE_OBJECTS_BATCH_SIZE:
+                self.flush()
+
+    def flush(self):
+        """Purge the orphans found so far."""
+        if self.orphan_objects:
+            failed = delete_stored_files(self.orphan_objects)
+            for name in failed:
+                self.stderr.write(f"Could not delete object: {name}")
+            self.orphan_objects = []
+        if self.orphan_rows:
+            SecureFile.objects.filter(
+                file__in=self.orphan_rows,
+                upload_status=SecureFile.UploadStatus.COMPLETE,
+            ).delete()
+            self.orphan_rows = []
+
+    def checkpoint(self, name):
+        """Purge pending orphans, then report that everything up to name is done."""
+        self.flush()
+        self.stdout.write(f"Checkpoint: {name}")
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app_files.tiering import TIER_BATCH_SIZE, TIER_WORKERS, tier_cold_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Move stored objects nobody downloaded lately to the STANDARD_IA or "
+        "GLACIER_IR storage class, as the nightly Celery task does."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=TIER_WORKERS,
+            help=f"Number of objects copied in parallel (default: {TIER_WORKERS}).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=TIER_BATCH_SIZE,
+            help=f"Files read from the database at a time (default: {TIER_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the objects that would move.",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "USE_S3", False):
+            raise CommandError("S3 is not configured, set USE_S3=True.")
+
+        moved = tier_cold_files(
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            dry_run=options["dry_run"],
+        )
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} objects."))
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="securefile",
+            name="upload_id",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="securefile",
+            name="upload_status",
+            field=models.CharField(
+                choices=[("pending", "Pending"), ("complete", "Complete")],
+                default="complete",
+                max_length=10,
+            ),
+        ),
+    ]
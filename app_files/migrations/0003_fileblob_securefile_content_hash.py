@@ -0,0 +1,60 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import app_files.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0002_securefile_upload_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("content_hash", models.CharField(max_length=64, unique=True)),
+                (
+                    "file",
+                    models.FileField(
+                        storage=app_files.storage.SecureFileStorage, upload_to=""
+                    ),
+                ),
+                ("file_size", models.BigIntegerField()),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("dtm_created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "File Blob",
+                "verbose_name_plural": "File Blobs",
+            },
+        ),
+        migrations.AddField(
+            model_name="securefile",
+            name="content_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="securefile",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="files",
+                to="app_files.fileblob",
+            ),
+        ),
+    ]
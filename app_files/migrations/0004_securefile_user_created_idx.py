@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0003_fileblob_securefile_content_hash"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="securefile",
+            index=models.Index(
+                fields=["uploaded_by", "dtm_created"], name="app_files_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:05
+
+import app_files.models
+import app_files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0004_securefile_user_created_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="fileblob",
+            name="file",
+            field=models.FileField(
+                storage=app_files.storage.get_secure_file_storage, upload_to=""
+            ),
+        ),
+        migrations.AlterField(
+            model_name="securefile",
+            name="file",
+            field=models.FileField(
+                storage=app_files.storage.get_secure_file_storage,
+                upload_to=app_files.models.get_file_path,
+            ),
+        ),
+    ]
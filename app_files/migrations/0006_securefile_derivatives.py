@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0005_secure_file_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="securefile",
+            name="derivatives",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_usage(apps, schema_editor):
+    SecureFile = apps.get_model("app_files", "SecureFile")
+    StorageUsage = apps.get_model("app_files", "StorageUsage")
+    totals = (
+        SecureFile.objects.filter(uploaded_by__isnull=False)
+        .order_by()
+        .values("uploaded_by")
+        .annotate(file_count=Count("pk"), total_bytes=Sum("file_size"))
+    )
+    StorageUsage.objects.bulk_create(
+        [
+            StorageUsage(
+                user_id=row["uploaded_by"],
+                file_count=row["file_count"],
+                total_bytes=row["total_bytes"],
+            )
+            for row in totals.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0006_securefile_derivatives"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StorageUsage",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="storage_usage",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("file_count", models.BigIntegerField(default=0)),
+                ("total_bytes", models.BigIntegerField(default=0)),
+                ("dtm_updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Storage Usage",
+                "verbose_name_plural": "Storage Usage",
+            },
+        ),
+        migrations.RunPython(populate_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# MySQL maintains its FULLTEXT index itself. On SQLite an external-content
+# FTS5 table mirrors the searched columns, kept in sync by triggers so that
+# bulk inserts, updates and deletes are covered as well as save() and delete().
+MYSQL_FORWARD = [
+    "CREATE FULLTEXT INDEX app_files_securefile_search "
+    "ON app_files_securefile (original_filename, description)",
+]
+MYSQL_REVERSE = [
+    "DROP INDEX app_files_securefile_search ON app_files_securefile",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE app_files_securefile_fts USING fts5("
+    "original_filename, description, "
+    "content='app_files_securefile', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO app_files_securefile_fts(app_files_securefile_fts) "
+    "VALUES ('rebuild')",
+    "CREATE TRIGGER app_files_securefile_fts_insert "
+    "AFTER INSERT ON app_files_securefile BEGIN "
+    "INSERT INTO app_files_securefile_fts(rowid, original_filename, description) "
+    "VALUES (new.id, new.original_filename, new.description); END",
+    "CREATE TRIGGER app_files_securefile_fts_delete "
+    "AFTER DELETE ON app_files_securefile BEGIN "
+    "INSERT INTO app_files_securefile_fts"
+    "(app_files_securefile_fts, rowid, original_filename, description) "
+    "VALUES ('delete', old.id, old.original_filename, old.description); END",
+    "CREATE TRIGGER app_files_securefile_fts_update "
+    "AFTER UPDATE OF original_filename, description ON app_files_securefile BEGIN "
+    "INSERT INTO app_files_securefile_fts"
+    "(app_files_securefile_fts, rowid, original_filename, description) "
+    "VALUES ('delete', old.id, old.original_filename, old.description); "
+    "INSERT INTO app_files_securefile_fts(rowid, original_filename, description) "
+    "VALUES (new.id, new.original_filename, new.description); END",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS app_files_securefile_fts_update",
+    "DROP TRIGGER IF EXISTS app_files_securefile_fts_delete",
+    "DROP TRIGGER IF EXISTS app_files_securefile_fts_insert",
+    "DROP TABLE IF EXISTS app_files_securefile_fts",
+]
+
+
+def run_for_vendor(mysql, sqlite):
+    def run(apps, schema_editor):
+        statements = {"mysql": mysql, "sqlite": sqlite}.get(
+            schema_editor.connection.vendor, []
+        )
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0007_storageusage"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(MYSQL_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(MYSQL_REVERSE, SQLITE_REVERSE),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0008_securefile_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="securefile",
+            index=models.Index(
+                fields=["uploaded_by", "upload_status", "dtm_updated"],
+                name="app_files_user_status_upd_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import app_files.archives
+import app_files.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0009_securefile_user_status_updated_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileArchive",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dtm_created", models.DateTimeField(auto_now_add=True)),
+                ("dtm_updated", models.DateTimeField(auto_now=True)),
+                ("slug", models.CharField(max_length=12, unique=True)),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True,
+                        storage=app_files.storage.get_secure_file_storage,
+                        upload_to=app_files.archives.get_archive_path,
+                    ),
+                ),
+                ("file_ids", models.JSONField(default=list)),
+                ("compression", models.CharField(default="store", max_length=10)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("ready", "Ready"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("size", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="file_archives",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "updated_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="updated_%(class)s",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "File Archive",
+                "verbose_name_plural": "File Archives",
+                "ordering": ["-dtm_created"],
+            },
+        ),
+    ]
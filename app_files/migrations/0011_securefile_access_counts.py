@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:28
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_migration = import_module("app_files.migrations.0008_securefile_search")
+
+# SQLite adds these columns by rebuilding the table, which drops the FTS
+# triggers of 0008. They are created again after the rebuild, both ways.
+SQLITE_TRIGGERS = [
+    statement
+    for statement in search_migration.SQLITE_REVERSE
+    if statement.startswith("DROP TRIGGER")
+] + [
+    statement
+    for statement in search_migration.SQLITE_FORWARD
+    if statement.startswith("CREATE TRIGGER")
+]
+restore_triggers = search_migration.run_for_vendor([], SQLITE_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0010_filearchive"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        migrations.AddField(
+            model_name="securefile",
+            name="download_count",
+            field=models.PositiveBigIntegerField(db_default=0, default=0),
+        ),
+        migrations.AddField(
+            model_name="securefile",
+            name="dtm_last_accessed",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:31
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# SQLite rebuilds the table to add the column, see 0011
+restore_triggers = import_module(
+    "app_files.migrations.0011_securefile_access_counts"
+).restore_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0011_securefile_access_counts"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        migrations.AddField(
+            model_name="securefile",
+            name="storage_class",
+            field=models.CharField(
+                choices=[
+                    ("STANDARD", "STANDARD"),
+                    ("STANDARD_IA", "STANDARD_IA"),
+                    ("GLACIER_IR", "GLACIER_IR"),
+                ],
+                default="STANDARD",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
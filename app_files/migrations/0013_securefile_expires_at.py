@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0012_securefile_storage_class"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="securefile",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="securefile",
+            index=models.Index(fields=["expires_at"], name="app_files_expires_idx"),
+        ),
+    ]
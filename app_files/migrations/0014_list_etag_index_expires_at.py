@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0013_securefile_expires_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="securefile",
+            name="app_files_user_status_upd_idx",
+        ),
+        migrations.AddIndex(
+            model_name="securefile",
+            index=models.Index(
+                fields=["uploaded_by", "upload_status", "dtm_updated", "expires_at"],
+                name="app_files_user_status_upd_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+# reconcile_storage merges the stored file names with the S3 listing, which
+# is in UTF-8 byte order. SQLite compares text with BINARY by default; MySQL
+# columns are switched to utf8mb4_bin so that ORDER BY and range filters on
+# the raw column, and its index, follow the same order.
+MYSQL_FORWARD = [
+    "ALTER TABLE app_files_securefile "
+    "MODIFY file varchar(100) COLLATE utf8mb4_bin NOT NULL",
+    "ALTER TABLE app_files_filearchive "
+    "MODIFY file varchar(100) COLLATE utf8mb4_bin NOT NULL",
+]
+MYSQL_REVERSE = [
+    "ALTER TABLE app_files_securefile MODIFY file varchar(100) NOT NULL",
+    "ALTER TABLE app_files_filearchive MODIFY file varchar(100) NOT NULL",
+]
+
+
+def run_for_vendor(mysql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "mysql":
+            for statement in mysql:
+                schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_files", "0014_list_etag_index_expires_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(MYSQL_FORWARD), run_for_vendor(MYSQL_REVERSE)
+        ),
+        migrations.AddIndex(
+            model_name="filearchive",
+            index=models.Index(fields=["file"], name="app_files_archive_file_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="securefile",
+            index=models.Index(
+                fields=["file", "upload_status"], name="app_files_file_status_idx"
+            ),
+        ),
+    ]
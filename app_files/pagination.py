@@ -0,0 +1,169 @@
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from datetime import datetime
+from urllib import parse
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Position of a row in (dtm_created, id) order
+Keyset = namedtuple("Keyset", ["reverse", "dtm_created", "pk"])
+
+
+class SecureFileCursorPagination(CursorPagination):
+    """
+    Keyset pagination over ``(dtm_created, id)``, newest first.
+
+    DRF's CursorPagination seeks on the first ordering field only and skips
+    rows that share its value with an OFFSET. Here the cursor carries both
+    values of the last row, so each page is a single range scan on the
+    ``(uploaded_by, dtm_created)`` index whatever its depth, and no COUNT(*)
+    is issued.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = ("-dtm_created", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        if reverse:
+            queryset = queryset.order_by("dtm_created", "id")
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.cursor is not None:
+            dtm_created, pk = self.cursor.dtm_created, self.cursor.pk
+            if reverse:
+                queryset = queryset.filter(
+                    Q(dtm_created__gt=dtm_created)
+                    | Q(dtm_created=dtm_created, id__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(dtm_created__lt=dtm_created)
+                    | Q(dtm_created=dtm_created, id__lt=pk)
+                )
+
+        # One extra row tells whether another page follows
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(Keyset(False, last.dtm_created, last.pk))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        first = self.page[0]
+        return self.encode_cursor(Keyset(True, first.dtm_created, first.pk))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = parse.parse_qs(querystring)
+            return Keyset(
+                reverse=bool(int(tokens.get("r", ["0"])[0])),
+                dtm_created=datetime.fromisoformat(tokens["t"][0]),
+                pk=int(tokens["p"][0]),
+            )
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        tokens = {"t": cursor.dtm_created.isoformat(), "p": cursor.pk}
+        if cursor.reverse:
+            tokens["r"] = "1"
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class SecureFileSearchPagination(PageNumberPagination):
+    """
+    Page-numbered pagination of ranked search results.
+
+    Relevance order cannot be paginated by keyset on ``dtm_created``, so
+    pages are taken with OFFSET. No COUNT(*) is issued and the page depth
+    is capped, which keeps every page a bounded read of the full-text index.
+    Responses have the same shape as SecureFileCursorPagination's.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    max_page = 20
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.page_number = 0
+        if not 1 <= self.page_number <= self.max_page:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.page_number - 1) * self.page_size
+        # One extra row tells whether another page follows
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.has_next = (
+            len(results) > self.page_size and self.page_number < self.max_page
+        )
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        del schema["properties"]["count"]
+        schema["required"].remove("count")
+        return schema
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Sum
+from rest_framework.exceptions import PermissionDenied
+
+from .models import SecureFile, StorageUsage
+
+User = get_user_model()
+
+
+def get_usage(user, lock=False):
+    """
+    Return the StorageUsage of a user, unsaved and empty if they have none.
+
+    With ``lock`` the row is created if needed and locked until the
+    transaction ends, so concurrent uploads of the user queue on it.
+    """
+    queryset = StorageUsage.objects.filter(user=user)
+    if lock:
+        queryset = queryset.select_for_update()
+    usage = queryset.first()
+    if usage is None and lock:
+        StorageUsage.objects.bulk_create(
+            [StorageUsage(user=user)], ignore_conflicts=True
+        )
+        usage = queryset.get()
+    return usage or StorageUsage(user=user)
+
+
+def check_quota(user, file_count, total_bytes, lock=True):
+    """
+    Raise PermissionDenied if adding the files would exceed the user's quota.
+
+    Call inside the transaction that creates the files: the usage row stays
+    locked until it ends, so two uploads cannot both pass the check.
+    STORAGE_QUOTA_BYTES and STORAGE_QUOTA_FILES of 0 mean no limit.
+    """
+    max_bytes = settings.STORAGE_QUOTA_BYTES
+    max_files = settings.STORAGE_QUOTA_FILES
+    if not max_bytes and not max_files:
+        return
+
+    usage = get_usage(user, lock=lock)
+    if max_bytes and usage.total_bytes + total_bytes > max_bytes:
+        raise PermissionDenied(
+            f"Storage quota exceeded: {usage.total_bytes + total_bytes} of "
+            f"{max_bytes} bytes.",
+            code="quota_exceeded",
+        )
+    if max_files and usage.file_count + file_count > max_files:
+        raise PermissionDenied(
+            f"File quota exceeded: at most {max_files} files.",
+            code="quota_exceeded",
+        )
+
+
+def reconcile_usage(chunk_size=1000):
+    """
+    Reset usage counters that drifted from the true aggregates.
+
+    Users are processed in primary key order, ``chunk_size`` at a time, each
+    chunk in its own transaction. Counter rows are locked before the files
+    are aggregated, so uploads and deletes of those users wait instead of
+    being overwritten.
+
+    Returns:
+        int: Number of users whose counters were corrected
+    """
+    corrected = 0
+    last_pk = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not user_ids:
+            return corrected
+        last_pk = user_ids[-1]
+
+        with transaction.atomic():
+            counters = {
+                usage.user_id: usage
+                for usage in StorageUsage.objects.select_for_update().filter(
+                    user_id__in=user_ids
+                )
+            }
+            totals = {
+                row["uploaded_by"]: (row["file_count"], row["total_bytes"])
+                for row in SecureFile.objects.filter(uploaded_by__in=user_ids)
+                .order_by()
+                .values("uploaded_by")
+                .annotate(file_count=Count("pk"), total_bytes=Sum("file_size"))
+            }
+
+            stale, missing = [], []
+            for user_id in user_ids:
+                file_count, total_bytes = totals.get(user_id, (0, 0))
+                usage = counters.get(user_id)
+                if usage is None:
+                    if file_count:
+                        missing.append(
+                            StorageUsage(
+                                user_id=user_id,
+                                file_count=file_count,
+                                total_bytes=total_bytes,
+                            )
+                        )
+                elif (usage.file_count, usage.total_bytes) != (
+                    file_count,
+                    total_bytes,
+                ):
+                    usage.file_count = file_count
+                    usage.total_bytes = total_bytes
+                    stale.append(usage)
+
+            StorageUsage.objects.bulk_update(stale, ["file_count", "total_bytes"])
+            StorageUsage.objects.bulk_create(missing, ignore_conflicts=True)
+            corrected += len(stale) + len(missing)
+
+        if len(user_ids) < chunk_size:
+            return corrected
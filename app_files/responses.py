@@ -0,0 +1,135 @@
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeFile:
+    """Read-only view of ``length`` bytes of a file starting at ``start``."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def get_validators(stat):
+    """
+    Return the (ETag, Last-Modified timestamp) of a stored file.
+
+    The ETag uses nginx's format (hex mtime and size), so responses served
+    by Django and by nginx through X-Accel-Redirect carry the same value.
+    """
+    mtime = int(stat.st_mtime)
+    return f'"{mtime:x}-{stat.st_size:x}"', mtime
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header.
+
+    Returns:
+        tuple: (start, end) inclusive, or None to serve the whole file
+
+    Raises:
+        ValueError: if the range cannot be satisfied
+    """
+    match = RANGE_RE.match(header or "")
+    if not match or match.groups() == ("", ""):
+        # Absent, malformed or multi-range requests get the whole file
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def serve_local_file(
+    request, storage, name, content_type, filename, disposition_type="attachment"
+):
+    """
+    Serve a locally stored file once the caller has authorized the request.
+
+    With SECURE_FILES_ACCEL_REDIRECT the transfer is handed to nginx through
+    X-Accel-Redirect and no bytes pass through Django. Otherwise the file is
+    streamed with FileResponse, honouring single byte ranges. Both paths
+    answer conditional requests with 304.
+    """
+    path = storage.path(name)
+    stat = os.stat(path)
+    etag, last_modified = get_validators(stat)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        as_attachment = disposition_type == "attachment"
+        if settings.SECURE_FILES_ACCEL_REDIRECT:
+            # nginx handles Range and serves the file from its internal location
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = settings.SECURE_FILES_ACCEL_PREFIX + quote(
+                name
+            )
+            response["Content-Disposition"] = content_disposition_header(
+                as_attachment, filename
+            )
+        else:
+            response = _file_response(
+                request, path, stat, etag, last_modified, content_type, filename
+            )
+            response["Content-Disposition"] = content_disposition_header(
+                as_attachment, filename
+            )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _file_response(request, path, stat, etag, last_modified, content_type, filename):
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if if_range is None or if_range in (etag, http_date(last_modified)):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+
+    file = open(path, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(
+            RangeFile(file, start, length), status=206, content_type=content_type
+        )
+        response["Content-Length"] = length
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,97 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+# Full-text indexes over (original_filename, description), created by
+# migration 0008: a FULLTEXT index on MySQL, an FTS5 table kept in sync by
+# triggers on SQLite. Migrations that make SQLite rebuild the table must
+# create the triggers again, as 0011 and 0012 do.
+FTS_TABLE = "app_files_securefile_fts"
+# Words of a query that are searched, the rest is ignored
+MAX_SEARCH_TERMS = 8
+
+WORD_RE = re.compile(r"\w+")
+
+
+def get_search_terms(query):
+    return WORD_RE.findall(query or "")[:MAX_SEARCH_TERMS]
+
+
+def search_files(queryset, query):
+    """
+    Filter SecureFiles to those matching every word of ``query``, as prefixes.
+
+    Rows are annotated with ``search_rank`` (higher is better) and ordered
+    by it. Uses the full-text index of the database; other backends fall
+    back to a LIKE scan.
+    """
+    terms = get_search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    table = queryset.model._meta.db_table
+    if connection.vendor == "mysql":
+        match = " ".join(f"+{term}*" for term in terms)
+        rank = RawSQL(
+            f"MATCH ({table}.original_filename, {table}.description) "
+            "AGAINST (%s IN BOOLEAN MODE)",
+            [match],
+            output_field=FloatField(),
+        )
+        queryset = queryset.annotate(search_rank=rank).filter(search_rank__gt=0)
+    elif connection.vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        queryset = queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            )
+        ).annotate(
+            # bm25() is lower for better matches
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= Q(original_filename__icontains=term) | Q(
+                description__icontains=term
+            )
+        queryset = queryset.filter(condition).annotate(
+            search_rank=Value(1.0, output_field=FloatField())
+        )
+    return queryset.order_by("-search_rank", "-id")
+
+
+class SecureFileSearchFilter(BaseFilterBackend):
+    """Ranked full-text search over file names and descriptions: ``?search=``."""
+
+    search_param = "search"
+
+    @classmethod
+    def get_query(cls, request):
+        return request.query_params.get(cls.search_param, "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_query(request)
+        if not query:
+            return queryset
+        return search_files(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.search_param,
+                "required": False,
+                "in": "query",
+                "description": "Words to find in file names and descriptions, "
+                "as prefixes. Results are ordered by relevance.",
+                "schema": {"type": "string"},
+            }
+        ]
@@ -1,12 +1,63 @@
+from django.db import models, transaction
+from django.utils import timezone
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
-from .models import SecureFile
+from app_core.serializers import SlugListSerializer
+
+from .archives import COMPRESSION_METHODS
+from .derivatives import schedule_derivatives
+from .handlers import S3StreamedFile
+from .models import (
+    ALLOWED_EXTENSIONS,
+    MAX_FILE_SIZE,
+    FileArchive,
+    FileBlob,
+    SecureFile,
+    compute_content_hash,
+)
+
+
+def validate_future(value):
+    if value is not None and value <= timezone.now():
+        raise serializers.ValidationError("Must be in the future.")
+
+
+class ExpiresAtField(serializers.DateTimeField):
+    """Optional expiry of a file, purged once it has passed."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("required", False)
+        kwargs.setdefault("allow_null", True)
+        kwargs.setdefault("validators", [validate_future])
+        super().__init__(**kwargs)
+
+
+class SecureFileListSerializer(serializers.ListSerializer):
+    """Signs the download URLs of every row on the page in one batch."""
+
+    def to_representation(self, data):
+        files = list(
+            data.all() if isinstance(data, models.manager.BaseManager) else data
+        )
+        disposition_type = self.context.get("disposition_type", "inline")
+        self.child.presigned_urls = SecureFile.generate_presigned_urls(
+            files, disposition_type=disposition_type
+        )
+        return super().to_representation(files)
+
+
+# Only written on create. A replaced file would skip content validation and
+# deduplication, and leave its blob pointing at the old content. The
+# metadata describes the stored content; the usage counters and
+# reconcile_usage() rely on file_size.
+CREATE_ONLY_FIELDS = ["file", "original_filename", "content_type", "file_size"]
 
 
 class SecureFileSerializer(serializers.ModelSerializer):
     file_download_url = serializers.SerializerMethodField()
+    expires_at = ExpiresAtField()
 
     class Meta:
         model = SecureFile
@@ -18,13 +69,26 @@ class SecureFileSerializer(serializers.ModelSerializer):
             "content_type",
             "file_size",
             "description",
+            "expires_at",
             "file_download_url",
         ]
         read_only_fields = ["id", "slug"]
+        list_serializer_class = SecureFileListSerializer
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            for name in CREATE_ONLY_FIELDS:
+                fields[name].read_only = True
+        return fields
 
     @extend_schema_field(OpenApiTypes.URI)
     def get_file_download_url(self, obj):
         """Generate a presigned download URL for the file."""
+        presigned_urls = getattr(self, "presigned_urls", None) or {}
+        if obj.pk in presigned_urls:
+            return presigned_urls[obj.pk]
+
         # Get disposition type from context, default to inline
         disposition_type = self.context.get("disposition_type", "inline")
         return obj.generate_presigned_url(disposition_type=disposition_type)
@@ -41,4 +105,91 @@ class SecureFileSerializer(serializers.ModelSerializer):
             validated_data["file_size"] = file.size
             validated_data["original_filename"] = file.name
 
-        return super().create(validated_data)
+        if isinstance(file, S3StreamedFile):
+            # Already stored by the upload handler, only record its name
+            validated_data["slug"] = file.slug
+            validated_data["file"] = file.storage_name
+            content_hash = file.sha256
+        elif file:
+            content_hash = compute_content_hash(file.chunks())
+            file.seek(0)
+        else:
+            return super().create(validated_data)
+
+        with transaction.atomic():
+            blob = (
+                FileBlob.objects.select_for_update()
+                .filter(content_hash=content_hash)
+                .first()
+            )
+            if blob is not None and not isinstance(file, S3StreamedFile):
+                # Same content is already stored, skip uploading another copy
+                validated_data["file"] = blob.file.name
+            instance = super().create(validated_data)
+            # Streamed duplicates are already in S3 and get deleted here
+            instance.attach_blob(content_hash)
+            schedule_derivatives([instance])
+        return instance
+
+
+class UploadInitiateSerializer(serializers.Serializer):
+    original_filename = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=100)
+    file_size = serializers.IntegerField(min_value=1, max_value=MAX_FILE_SIZE)
+    description = serializers.CharField(required=False, allow_blank=True)
+    expires_at = ExpiresAtField()
+
+    def validate_original_filename(self, value):
+        ext = value.lower().split(".")[-1] if "." in value else ""
+        if f".{ext}" not in ALLOWED_EXTENSIONS:
+            raise serializers.ValidationError("File type not supported.")
+        return value
+
+
+class UploadPartsSerializer(serializers.Serializer):
+    part_numbers = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
+
+
+class UploadedPartSerializer(serializers.Serializer):
+    part_number = serializers.IntegerField(min_value=1)
+    etag = serializers.CharField()
+
+
+class UploadCompleteSerializer(serializers.Serializer):
+    parts = UploadedPartSerializer(many=True, required=False)
+
+
+class ArchiveRequestSerializer(SlugListSerializer):
+    compression = serializers.ChoiceField(
+        choices=list(COMPRESSION_METHODS), default="store"
+    )
+    # Build the archive in the background even when it could be streamed
+    background = serializers.BooleanField(default=False)
+
+
+class FileArchiveSerializer(serializers.ModelSerializer):
+    file_count = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FileArchive
+        fields = [
+            "slug",
+            "status",
+            "compression",
+            "file_count",
+            "size",
+            "download_url",
+            "dtm_created",
+        ]
+        read_only_fields = fields
+
+    def get_file_count(self, obj) -> int:
+        return len(obj.file_ids)
+
+    @extend_schema_field(OpenApiTypes.URI)
+    def get_download_url(self, obj):
+        """Presigned URL of the archive once it is ready."""
+        return obj.generate_presigned_url(expiration=300)
@@ -1,10 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
-from .models import SecureFile
-from .serializers import SecureFileSerializer
+from .deletion import schedule_deletion
+from .derivatives import schedule_derivatives
+from .models import (
+    FileBlob,
+    SecureFile,
+    StorageUsage,
+    compute_content_hash,
+    get_file_path,
+)
+from .quotas import check_quota
+from .serializers import SecureFileSerializer, UploadInitiateSerializer
+from .tiering import STANDARD
 
 User = get_user_model()
 
+# Files accepted by one bulk upload, matching DATA_UPLOAD_MAX_NUMBER_FILES
+BULK_UPLOAD_MAX_FILES = 100
+# S3 PUTs running in parallel for one bulk upload
+BULK_UPLOAD_WORKERS = 8
+
 
 def create_secure_file(file_obj, description=None, user=None):
     """
@@ -39,3 +58,205 @@ def create_secure_file(file_obj, description=None, user=None):
     # Save the file
     secure_file = serializer.save(uploaded_by=user)
     return secure_file, None
+
+
+def _hash_file(file_obj):
+    content_hash = compute_content_hash(file_obj.chunks())
+    file_obj.seek(0)
+    return content_hash
+
+
+def _store_file(secure_file, file_obj):
+    """Upload one file under its final name. Runs in a worker thread."""
+    try:
+        name = get_file_path(secure_file, file_obj.name)
+        secure_file.file.name = secure_file.file.storage.save(name, file_obj)
+        return None
+    except (BotoCoreError, ClientError, OSError) as e:
+        print(f"Error storing {file_obj.name}: {e}")
+        return "Could not store file."
+
+
+def _store_contents(executor, groups, content_hashes, errors):
+    """
+    Upload the first file of each content in ``content_hashes`` concurrently.
+
+    Files whose upload failed are removed from ``groups`` and reported in
+    ``errors``.
+
+    Returns:
+        list: Names of the stored objects
+    """
+    uploads = {}
+    for content_hash in content_hashes:
+        secure_file, _, file_obj = groups[content_hash][0]
+        uploads[content_hash] = executor.submit(_store_file, secure_file, file_obj)
+    stored_names = []
+    for content_hash, future in uploads.items():
+        error = future.result()
+        if error is None:
+            stored_names.append(groups[content_hash][0][0].file.name)
+            continue
+        for _, index, file_obj in groups.pop(content_hash):
+            errors.append(
+                {"index": index, "filename": file_obj.name, "errors": {"file": [error]}}
+            )
+    return stored_names
+
+
+def create_secure_files(file_objs, description=None, user=None, expires_at=None):
+    """
+    Create SecureFile instances for many uploaded files at once.
+
+    Files are validated individually, uploaded concurrently on a bounded
+    thread pool and inserted with a single bulk_create. Content that is
+    already stored, or repeated within the batch, is not uploaded again.
+    The quota check, blob references and insert run in one short
+    transaction after the uploads.
+
+    Args:
+        file_objs (list): The uploaded file objects
+        description (str, optional): Description applied to every file
+        user (User, optional): User who uploaded the files
+        expires_at (datetime, optional): Expiry applied to every file
+
+    Returns:
+        tuple: (list of created SecureFile instances, list of error dicts)
+            - Each error dict holds the ``index`` and ``filename`` of the
+              rejected file and its ``errors``
+    """
+    errors = []
+    accepted = []
+    for index, file_obj in enumerate(file_objs):
+        serializer = UploadInitiateSerializer(
+            data={
+                "original_filename": file_obj.name,
+                "content_type": file_obj.content_type,
+                "file_size": file_obj.size,
+            }
+        )
+        if serializer.is_valid():
+            accepted.append((index, file_obj))
+        else:
+            errors.append(
+                {"index": index, "filename": file_obj.name, "errors": serializer.errors}
+            )
+    if not accepted:
+        return [], errors
+
+    slugs = SecureFile.allocate_slugs(len(accepted))
+    secure_files = [
+        SecureFile(
+            slug=slug,
+            original_filename=file_obj.name,
+            content_type=file_obj.content_type,
+            file_size=file_obj.size,
+            description=description,
+            expires_at=expires_at,
+            uploaded_by=user,
+        )
+        for slug, (_, file_obj) in zip(slugs, accepted)
+    ]
+
+    with ThreadPoolExecutor(max_workers=BULK_UPLOAD_WORKERS) as executor:
+        hashes = list(executor.map(_hash_file, [f for _, f in accepted]))
+        groups = {}
+        for secure_file, content_hash, (index, file_obj) in zip(
+            secure_files, hashes, accepted
+        ):
+            secure_file.content_hash = content_hash
+            groups.setdefault(content_hash, []).append((secure_file, index, file_obj))
+
+        if user is not None:
+            # Unlocked, so an upload over quota fails before storing anything
+            check_quota(
+                user,
+                len(secure_files),
+                sum(secure_file.file_size for secure_file in secure_files),
+                lock=False,
+            )
+        # Uploads run before the transaction, so no lock is held while they
+        # do. Content already stored is not uploaded again.
+        missing = set(groups) - set(
+            FileBlob.objects.filter(content_hash__in=groups).values_list(
+                "content_hash", flat=True
+            )
+        )
+        stored_names = []
+        while True:
+            stored_names += _store_contents(executor, groups, missing, errors)
+            try:
+                with transaction.atomic():
+                    if user is not None:
+                        # Locks the usage row until the files are counted
+                        check_quota(
+                            user,
+                            sum(len(group) for group in groups.values()),
+                            sum(
+                                secure_file.file_size
+                                for group in groups.values()
+                                for secure_file, _, _ in group
+                            ),
+                        )
+                    # Locked so a concurrent delete cannot remove them meanwhile
+                    blobs = set(
+                        FileBlob.objects.select_for_update()
+                        .filter(content_hash__in=groups)
+                        .values_list("content_hash", flat=True)
+                    )
+                    # Blobs released since they were looked up need an upload
+                    missing = {
+                        content_hash
+                        for content_hash, group in groups.items()
+                        if content_hash not in blobs and not group[0][0].file.name
+                    }
+                    if not missing:
+                        created = _insert_files(groups)
+                        schedule_derivatives(created)
+            except Exception:
+                # Nothing was committed, remove the uploads
+                schedule_deletion(stored_names)
+                raise
+            if not missing:
+                break
+
+    # Report files in the order they were sent
+    order = {secure_file.slug: i for i, secure_file in enumerate(secure_files)}
+    created.sort(key=lambda secure_file: order[secure_file.slug])
+    errors.sort(key=lambda error: error["index"])
+    return created, errors
+
+
+def _insert_files(groups):
+    """Take the blob references for each content and bulk insert the rows."""
+    blobs = FileBlob.acquire_many(
+        {
+            content_hash: (group[0][0].file.name, group[0][0].file_size, len(group))
+            for content_hash, group in groups.items()
+        }
+    )
+
+    # Objects stored before may have been tiered already
+    storage_classes = FileBlob.get_storage_classes([blob.pk for blob in blobs.values()])
+
+    created = []
+    redundant_names = []
+    for content_hash, group in groups.items():
+        first, blob = group[0][0], blobs[content_hash]
+        if first.file.name and blob.file.name != first.file.name:
+            # Another upload stored the same content first
+            redundant_names.append(first.file.name)
+        for secure_file, _, _ in group:
+            secure_file.blob = blob
+            secure_file.file.name = blob.file.name
+            secure_file.storage_class = storage_classes.get(blob.pk, STANDARD)
+            created.append(secure_file)
+
+    SecureFile.objects.bulk_create(created)
+    if created and created[0].pk is None:
+        # Backends without RETURNING do not set primary keys
+        created = list(SecureFile.objects.filter(slug__in=[f.slug for f in created]))
+    StorageUsage.add_files(created)
+
+    schedule_deletion(redundant_names)
+    return created
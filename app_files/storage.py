@@ -1,5 +1,11 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from app_files.clients import get_s3_resource
+
 
 class SecureFileStorage(S3Boto3Storage):
     """
@@ -10,6 +16,28 @@ class SecureFileStorage(S3Boto3Storage):
     file_overwrite = False
     default_acl = "private"
 
+    @property
+    def connection(self):
+        """Reuse the process-wide boto3 session instead of building one per thread."""
+        if self.session_profile:
+            return super().connection
+        return get_s3_resource(
+            region_name=self.region_name,
+            access_key=self.access_key,
+            secret_key=self.secret_key,
+            session_token=self.security_token,
+            endpoint_url=self.endpoint_url,
+            config=self.client_config,
+            use_ssl=self.use_ssl,
+            verify=self.verify,
+        )
+
+    @property
+    def bucket(self):
+        # Not memoized: the cached bucket would pin one thread's resource
+        # and survive a fork along with its connection pool.
+        return self.connection.Bucket(self.bucket_name)
+
     def get_accessed_time(self, name):
         return None
 
@@ -18,3 +46,26 @@ class SecureFileStorage(S3Boto3Storage):
 
     def path(self, name):
         raise NotImplementedError("S3 storage does not support path()")
+
+
+class LocalSecureFileStorage(FileSystemStorage):
+    """
+    Storage for secure files on local disk, used when USE_S3 is off.
+
+    Files live under MEDIA_ROOT/secure_files. nginx refuses direct requests
+    for that directory, so they are only served through the permission-checked
+    download endpoints.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("location", os.path.join(settings.MEDIA_ROOT, "secure_files"))
+        kwargs.setdefault("base_url", f"{settings.MEDIA_URL}secure_files/")
+        kwargs.setdefault("file_permissions_mode", 0o640)
+        super().__init__(**kwargs)
+
+
+def get_secure_file_storage():
+    """Return the storage for SecureFile content: S3 when USE_S3 is on, else local disk."""
+    if getattr(settings, "USE_S3", False):
+        return SecureFileStorage()
+    return LocalSecureFileStorage()
@@ -0,0 +1,214 @@
+from botocore.exceptions import BotoCoreError, ClientError
+from celery import shared_task
+from PIL import Image, UnidentifiedImageError
+
+from app_files.access import flush_access_counts
+from app_files.archives import build_archive, purge_expired_archives
+from app_files.deletion import delete_stored_files
+from app_files.derivatives import generate_derivatives, get_original_name
+from app_files.expiry import purge_expired_files
+from app_files.models import FileArchive, SecureFile
+from app_files.quotas import reconcile_usage
+from app_files.tiering import restore_files, tier_cold_files
+from app_files.uploads import deduplicate_upload, expire_pending_uploads
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=60)
+def delete_stored_files_task(self, names):
+    """
+    Celery task to delete stored files in batches
+
+    Args:
+        names: Storage names of the files to delete
+
+    Returns:
+        int: Number of files deleted
+    """
+    failed = delete_stored_files(names)
+    if failed:
+        raise self.retry(args=[failed])
+    return len(set(names))
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=60)
+def delete_unreferenced_files_task(self, names):
+    """
+    Celery task to delete stored files no SecureFile refers to any more
+
+    Names a file refers to again are kept, with their derivatives.
+
+    Args:
+        names: Storage names of the files to delete
+
+    Returns:
+        int: Number of files deleted
+    """
+    originals = {name: get_original_name(name) or name for name in names}
+    referenced = set(
+        SecureFile.objects.filter(file__in=set(originals.values())).values_list(
+            "file", flat=True
+        )
+    )
+    names = [name for name in names if originals[name] not in referenced]
+    failed = delete_stored_files(names)
+    if failed:
+        raise self.retry(args=[failed])
+    return len(set(names))
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def deduplicate_upload_task(self, file_id):
+    """
+    Celery task to hash a completed direct upload and share identical content
+
+    Args:
+        file_id: Primary key of the SecureFile
+
+    Returns:
+        bool: Whether the file was hashed
+    """
+    hashed = deduplicate_upload(file_id)
+    if hashed is None:
+        raise self.retry()
+    return hashed
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def generate_derivatives_task(self, file_ids):
+    """
+    Celery task to generate image thumbnails and previews
+
+    Args:
+        file_ids: Primary keys of the SecureFiles to process
+
+    Returns:
+        int: Number of files whose derivatives were generated
+    """
+    generated = 0
+    failed = []
+    files = SecureFile.objects.filter(
+        pk__in=file_ids, upload_status=SecureFile.UploadStatus.COMPLETE
+    )
+    for secure_file in files:
+        try:
+            generated += generate_derivatives(secure_file)
+        except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+            # Not a usable image, retrying would not help
+            print(f"Error generating derivatives of {secure_file.slug}: {e}")
+        except (BotoCoreError, ClientError, OSError) as e:
+            print(f"Error generating derivatives of {secure_file.slug}: {e}")
+            failed.append(secure_file.pk)
+    if failed:
+        raise self.retry(args=[failed])
+    return generated
+
+
+@shared_task
+def reconcile_storage_usage_task(chunk_size=1000):
+    """
+    Celery beat task to correct drifted per-user storage usage counters
+
+    Args:
+        chunk_size: Users reconciled per transaction
+
+    Returns:
+        int: Number of users whose counters were corrected
+    """
+    return reconcile_usage(chunk_size)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def build_archive_task(self, archive_id):
+    """
+    Celery task to build a ZIP archive of many files and store it
+
+    Args:
+        archive_id: Primary key of the pending FileArchive
+
+    Returns:
+        str: Presigned URL of the archive, None if it could not be built
+    """
+    archive = FileArchive.objects.filter(
+        pk=archive_id, status=FileArchive.Status.PENDING
+    ).first()
+    if archive is None:
+        return None
+    try:
+        build_archive(archive)
+    except (BotoCoreError, ClientError, OSError) as e:
+        print(f"Error building archive {archive.slug}: {e}")
+        if self.request.retries < self.max_retries:
+            raise self.retry()
+        archive.status = FileArchive.Status.FAILED
+        archive.save(update_fields=["status", "dtm_updated"])
+        return None
+    return archive.generate_presigned_url()
+
+
+@shared_task
+def purge_expired_archives_task():
+    """
+    Celery beat task to delete archives past their retention
+
+    Returns:
+        int: Number of archives deleted
+    """
+    return purge_expired_archives()
+
+
+@shared_task
+def flush_access_counts_task():
+    """
+    Celery beat task to write the download counts buffered in Redis
+
+    Returns:
+        int: Number of files updated
+    """
+    return flush_access_counts()
+
+
+@shared_task
+def tier_cold_files_task():
+    """
+    Celery beat task to move files nobody downloaded lately to colder storage
+
+    Returns:
+        int: Number of objects moved
+    """
+    return tier_cold_files()
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def restore_storage_class_task(self, file_ids):
+    """
+    Celery task to move downloaded cold files back to STANDARD storage
+
+    Args:
+        file_ids: Primary keys of the SecureFiles to restore
+
+    Returns:
+        int: Number of objects moved
+    """
+    return restore_files(file_ids)
+
+
+@shared_task
+def purge_expired_files_task():
+    """
+    Celery beat task to delete files past their expires_at
+
+    Returns:
+        int: Number of files purged
+    """
+    return purge_expired_files()
+
+
+@shared_task
+def expire_pending_uploads_task():
+    """
+    Celery beat task to discard abandoned direct uploads
+
+    Returns:
+        int: Number of pending uploads discarded
+    """
+    return expire_pending_uploads()
@@ -0,0 +1,691 @@
+import io
+import tempfile
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest import mock
+from urllib.parse import parse_qsl, unquote
+
+import boto3
+from botocore.config import Config
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from app_files import uploads
+from app_files.deletion import schedule_deletion
+from app_files.derivatives import generate_derivatives
+from app_files.models import FileArchive, FileBlob, SecureFile
+from app_files.quotas import get_usage
+from app_files.responses import parse_range
+from app_files.signing import PresignedURLBatch, sign_local_url, verify_local_url
+from app_files.storage import get_secure_file_storage
+from app_files.tasks import delete_unreferenced_files_task
+from app_files.tiering import GLACIER_IR, STANDARD, STANDARD_IA, schedule_restore
+
+User = get_user_model()
+
+
+class SecureFileUpdateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="owner", email="owner@example.com", password="secret"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.secure_file = SecureFile.objects.create(
+            file="secure_files/report.pdf",
+            original_filename="report.pdf",
+            content_type="application/pdf",
+            file_size=1024,
+            uploaded_by=self.user,
+        )
+
+    def test_patch_ignores_file_size(self):
+        response = self.client.patch(
+            reverse("file-detail", args=[self.secure_file.slug]),
+            {"file_size": 0, "description": "Q3 report"},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.secure_file.refresh_from_db()
+        self.assertEqual(self.secure_file.file_size, 1024)
+        self.assertEqual(self.secure_file.description, "Q3 report")
+        self.assertEqual(get_usage(self.user).total_bytes, 1024)
+
+    def test_bulk_partial_update_ignores_file_size(self):
+        response = self.client.patch(
+            reverse("file-bulk-update"),
+            [{"slug": self.secure_file.slug, "file_size": 0}],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.secure_file.refresh_from_db()
+        self.assertEqual(self.secure_file.file_size, 1024)
+
+
+class ReconcileStorageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="owner", email="owner@example.com", password="secret"
+        )
+        SecureFile.objects.create(
+            file="secure_files/report.pdf",
+            original_filename="report.pdf",
+            content_type="application/pdf",
+            file_size=1024,
+            uploaded_by=self.user,
+        )
+        FileArchive.objects.create(
+            file="archives/2025/01/abcdefghijkl.zip",
+            created_by=self.user,
+            file_ids=[],
+            status=FileArchive.Status.READY,
+        )
+
+    def reconcile(self, stored, *args):
+        """Run reconcile_storage over the given listing, return the purged names."""
+        command = "app_files.management.commands.reconcile_storage"
+        with (
+            override_settings(AWS_STORAGE_BUCKET_NAME="bucket"),
+            mock.patch(f"{command}.get_default_s3_client"),
+            mock.patch(f"{command}.iter_stored_objects", return_value=iter(stored)),
+            mock.patch(f"{command}.delete_stored_files", return_value=[]) as delete,
+        ):
+            call_command("reconcile_storage", *args, stdout=io.StringIO())
+        return [name for call in delete.call_args_list for name in call.args[0]]
+
+    def test_purge_objects_keeps_archives(self):
+        last_modified = timezone.now() - timedelta(days=7)
+        stored = [
+            ("archives/2025/01/abcdefghijkl.zip", last_modified),
+            ("archives/2025/01/orphan000000.zip", last_modified),
+            ("secure_files/orphan.pdf", last_modified),
+            ("secure_files/report.pdf", last_modified),
+        ]
+
+        purged = self.reconcile(stored, "--purge-objects")
+
+        self.assertEqual(
+            purged, ["archives/2025/01/orphan000000.zip", "secure_files/orphan.pdf"]
+        )
+
+    def test_resume_keeps_derivatives_of_checkpoint(self):
+        SecureFile.objects.create(
+            file="secure_files/photo.jpg",
+            original_filename="photo.jpg",
+            content_type="image/jpeg",
+            file_size=2048,
+            uploaded_by=self.user,
+        )
+        last_modified = timezone.now() - timedelta(days=7)
+        # Listing resumed right after the original image
+        stored = [
+            ("secure_files/photo.jpg.preview.jpg", last_modified),
+            ("secure_files/photo.jpg.thumbnail.jpg", last_modified),
+            ("secure_files/removed.jpg.thumbnail.jpg", last_modified),
+            ("secure_files/report.pdf", last_modified),
+        ]
+
+        purged = self.reconcile(
+            stored, "--purge-objects", "--start-after", "secure_files/photo.jpg"
+        )
+
+        self.assertEqual(purged, ["secure_files/removed.jpg.thumbnail.jpg"])
+
+    def test_purge_rows_respects_key_order(self):
+        # Upper case sorts before lower case in S3 key (byte) order
+        SecureFile.objects.create(
+            file="secure_files/Zeta.pdf",
+            original_filename="Zeta.pdf",
+            content_type="application/pdf",
+            file_size=10,
+            uploaded_by=self.user,
+        )
+        last_modified = timezone.now() - timedelta(days=7)
+        stored = [
+            ("archives/2025/01/abcdefghijkl.zip", last_modified),
+            ("secure_files/Zeta.pdf", last_modified),
+            ("secure_files/report.pdf", last_modified),
+        ]
+
+        purged = self.reconcile(stored, "--purge-objects", "--purge-rows")
+
+        self.assertEqual(purged, [])
+        self.assertEqual(SecureFile.objects.count(), 2)
+
+
+class DerivativeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="owner", email="owner@example.com", password="secret"
+        )
+        self.blob = FileBlob.objects.create(
+            content_hash="a" * 64, file="secure_files/photo.jpg", file_size=2048
+        )
+
+    def create_image(self, **kwargs):
+        return SecureFile.objects.create(
+            file="secure_files/photo.jpg",
+            original_filename="photo.jpg",
+            content_type="image/jpeg",
+            file_size=2048,
+            uploaded_by=self.user,
+            **kwargs,
+        )
+
+    @override_settings(SECURE_FILES_DERIVATIVE_SIZES={"thumbnail": (256, 256)})
+    def test_reuses_derivatives_of_files_sharing_the_blob(self):
+        thumbnail = {"name": "t.jpg", "width": 256, "height": 192, "size": [256, 256]}
+        self.create_image(blob=self.blob, derivatives={"thumbnail": thumbnail})
+        secure_file = self.create_image(blob=self.blob)
+        unrelated = self.create_image()
+
+        self.assertTrue(generate_derivatives(secure_file))
+
+        secure_file.refresh_from_db()
+        unrelated.refresh_from_db()
+        self.assertEqual(secure_file.derivatives, {"thumbnail": thumbnail})
+        self.assertEqual(unrelated.derivatives, {})
+
+    def test_thumbnail_polls_requeue_once(self):
+        secure_file = self.create_image()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        redis_client = mock.Mock()
+        redis_client.set.side_effect = [True, False]
+        with (
+            mock.patch(
+                "app_files.derivatives.get_redis_client", return_value=redis_client
+            ),
+            mock.patch("app_files.tasks.generate_derivatives_task.delay") as delay,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            for _ in range(2):
+                response = client.get(
+                    reverse("file-thumbnail", args=[secure_file.slug])
+                )
+                self.assertEqual(response.status_code, 202)
+
+        delay.assert_called_once_with([secure_file.pk])
+
+
+class TieringTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="owner", email="owner@example.com", password="secret"
+        )
+        self.blob = FileBlob.objects.create(
+            content_hash="b" * 64, file="secure_files/cold.pdf", file_size=1 << 20
+        )
+        self.cold = SecureFile.objects.create(
+            file="secure_files/cold.pdf",
+            original_filename="cold.pdf",
+            content_type="application/pdf",
+            file_size=1 << 20,
+            uploaded_by=self.user,
+            blob=self.blob,
+            storage_class=GLACIER_IR,
+        )
+
+    def test_new_reference_copies_tier_of_blob(self):
+        secure_file = SecureFile.objects.create(
+            file="secure_files/copy.pdf",
+            original_filename="copy.pdf",
+            content_type="application/pdf",
+            file_size=1 << 20,
+            uploaded_by=self.user,
+        )
+        self.assertEqual(secure_file.storage_class, STANDARD)
+
+        secure_file.attach_blob("b" * 64)
+
+        secure_file.refresh_from_db()
+        self.assertEqual(secure_file.file.name, "secure_files/cold.pdf")
+        self.assertEqual(secure_file.storage_class, GLACIER_IR)
+
+    def test_restore_needs_repeated_downloads(self):
+        downloads = iter(range(1, 6))
+        redis_client = mock.Mock()
+        redis_client.pipeline.return_value.execute.side_effect = lambda: [
+            None,
+            next(downloads),
+        ]
+        with (
+            mock.patch("app_files.tiering.get_redis_client", return_value=redis_client),
+            mock.patch("app_files.tasks.restore_storage_class_task.delay") as delay,
+        ):
+            for _ in range(2):
+                schedule_restore(self.cold)
+            delay.assert_not_called()
+            for _ in range(3):
+                schedule_restore(self.cold)
+
+        delay.assert_called_once_with([self.cold.pk])
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME="bucket")
+class MigrateStorageKeysTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="owner", email="owner@example.com", password="secret"
+        )
+        self.secure_file = SecureFile.objects.create(
+            file="2024/01/report.pdf",
+            original_filename="report.pdf",
+            content_type="application/pdf",
+            file_size=1 << 20,
+            uploaded_by=self.user,
+            storage_class=STANDARD_IA,
+        )
+
+    def test_copy_keeps_storage_class(self):
+        command = "app_files.management.commands.migrate_storage_keys"
+        with (
+            mock.patch(f"{command}.get_default_s3_client") as get_client,
+            mock.patch(
+                f"{command}.delete_unreferenced_files_task.apply_async"
+            ) as delete_later,
+        ):
+            call_command("migrate_storage_keys", stdout=io.StringIO())
+
+        self.secure_file.refresh_from_db()
+        self.assertRegex(self.secure_file.file.name, r"^[0-9a-f]{2}/[0-9a-f]{2}/")
+        copy = get_client.return_value.copy_object.call_args.kwargs
+        self.assertEqual(copy["StorageClass"], STANDARD_IA)
+        self.assertEqual(
+            delete_later.call_args.kwargs["args"], [["2024/01/report.pdf"]]
+        )
+
+    def test_delayed_delete_keeps_names_written_back(self):
+        # A stale full save() put the old name back after the renaming
+        names = [
+            "2024/01/report.pdf",
+            "2024/01/report.pdf.thumbnail.jpg",
+            "2024/01/gone.pdf",
+        ]
+        with mock.patch(
+            "app_files.tasks.delete_stored_files", return_value=[]
+        ) as delete:
+            self.assertEqual(delete_unreferenced_files_task(names), 1)
+
+        delete.assert_called_once_with(["2024/01/gone.pdf"])
+
+
+class BulkDeleteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="owner", email="owner@example.com", password="secret"
+        )
+        self.blob = FileBlob.objects.create(
+            content_hash="c" * 64,
+            file="secure_files/shared.pdf",
+            file_size=100,
+            ref_count=2,
+        )
+        self.shared = [
+            self.create_file("secure_files/shared.pdf", blob=self.blob)
+            for _ in range(2)
+        ]
+        self.unshared = self.create_file("secure_files/own.pdf")
+
+    def create_file(self, name, **kwargs):
+        return SecureFile.objects.create(
+            file=name,
+            original_filename="report.pdf",
+            content_type="application/pdf",
+            file_size=100,
+            uploaded_by=self.user,
+            **kwargs,
+        )
+
+    def bulk_delete(self, files):
+        with mock.patch("app_files.models.schedule_deletion") as schedule:
+            deleted = SecureFile.objects.filter(
+                pk__in=[secure_file.pk for secure_file in files]
+            ).bulk_delete()
+        return deleted, [
+            name for call in schedule.call_args_list for name in call.args[0]
+        ]
+
+    def test_releases_one_reference_per_file(self):
+        deleted, scheduled = self.bulk_delete([self.shared[0], self.unshared])
+
+        self.assertEqual(deleted, (2, {"app_files.SecureFile": 2}))
+        self.assertEqual(scheduled, ["secure_files/own.pdf"])
+        self.blob.refresh_from_db()
+        self.assertEqual(self.blob.ref_count, 1)
+        usage = get_usage(self.user)
+        self.assertEqual((usage.file_count, usage.total_bytes), (1, 100))
+
+    def test_deletes_object_with_last_reference(self):
+        deleted, scheduled = self.bulk_delete(self.shared)
+
+        self.assertEqual(deleted[0], 2)
+        self.assertEqual(scheduled, ["secure_files/shared.pdf"])
+        self.assertFalse(FileBlob.objects.filter(pk=self.blob.pk).exists())
+
+    def test_single_delete_releases_reference(self):
+        with mock.patch("app_files.models.schedule_deletion") as schedule:
+            self.shared[0].delete()
+
+        schedule.assert_not_called()
+        self.blob.refresh_from_db()
+        self.assertEqual(self.blob.ref_count, 1)
+        self.assertEqual(get_usage(self.user).file_count, 2)
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME="bucket")
+class DirectUploadCompleteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="owner", email="owner@example.com", password="secret"
+        )
+        self.secure_file = SecureFile.objects.create(
+            file="secure_files/direct.pdf",
+            original_filename="direct.pdf",
+            content_type="application/pdf",
+            file_size=9,
+            uploaded_by=self.user,
+            upload_status=SecureFile.UploadStatus.PENDING,
+        )
+        patcher = mock.patch("app_files.uploads.get_default_s3_client")
+        self.s3_client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.s3_client.head_object.return_value = {
+            "ContentLength": 9,
+            "ContentType": "application/pdf",
+        }
+
+    def store(self, content):
+        self.s3_client.get_object.return_value = {"Body": io.BytesIO(content)}
+
+    def test_completes_and_schedules_deduplication(self):
+        self.store(b"%PDF-1.7\n")
+        with (
+            mock.patch("app_files.tasks.deduplicate_upload_task.delay") as delay,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            uploads.complete_upload(self.secure_file)
+
+        self.secure_file.refresh_from_db()
+        self.assertEqual(
+            self.secure_file.upload_status, SecureFile.UploadStatus.COMPLETE
+        )
+        delay.assert_called_once_with(self.secure_file.pk)
+
+    def test_rejects_content_not_matching_type(self):
+        self.store(b"MZ\x90\x00exe")
+        with self.assertRaisesMessage(ValidationError, "does not match its type"):
+            uploads.complete_upload(self.secure_file)
+
+        self.assertFalse(SecureFile.objects.filter(pk=self.secure_file.pk).exists())
+
+    def test_second_completion_is_rejected(self):
+        self.store(b"%PDF-1.7\n")
+        uploads.complete_upload(self.secure_file)
+
+        with self.assertRaisesMessage(ValidationError, "already complete"):
+            uploads.complete_upload(self.secure_file)
+        self.s3_client.head_object.assert_called_once()
+
+    def test_deduplicates_onto_stored_blob(self):
+        blob = FileBlob.objects.create(
+            content_hash="d" * 64,
+            file="secure_files/first.pdf",
+            file_size=9,
+            ref_count=1,
+        )
+        SecureFile.objects.filter(pk=self.secure_file.pk).update(
+            upload_status=SecureFile.UploadStatus.COMPLETE
+        )
+        with (
+            mock.patch("app_files.uploads.hash_stored_file", return_value="d" * 64),
+            mock.patch("app_files.models.schedule_deletion") as schedule,
+        ):
+            self.assertTrue(uploads.deduplicate_upload(self.secure_file.pk))
+            self.assertFalse(uploads.deduplicate_upload(self.secure_file.pk))
+
+        self.secure_file.refresh_from_db()
+        blob.refresh_from_db()
+        self.assertEqual(self.secure_file.file.name, "secure_files/first.pdf")
+        self.assertEqual(blob.ref_count, 2)
+        schedule.assert_called_once_with(["secure_files/direct.pdf"])
+
+
+class PresignedURLBatchTests(TestCase):
+    def setUp(self):
+        self.client = boto3.client(
+            "s3",
+            region_name="eu-west-1",
+            aws_access_key_id="AKIDEXAMPLE",
+            aws_secret_access_key="secret",
+            config=Config(signature_version="s3v4"),
+        )
+        now = datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc)
+        for target, attribute in [
+            ("app_files.signing.datetime", "now"),
+            ("botocore.auth.datetime.datetime", "utcnow"),
+        ]:
+            patcher = mock.patch(target)
+            clock = patcher.start()
+            getattr(clock, attribute).return_value = (
+                now if attribute == "now" else now.replace(tzinfo=None)
+            )
+            self.addCleanup(patcher.stop)
+
+    def test_urls_match_boto3(self):
+        batch = PresignedURLBatch(
+            self.client, self.client._request_signer._credentials, "bucket"
+        )
+        for key in ["2026/01/report.pdf", "2026/01/rapport été (1).pdf"]:
+            disposition = "attachment; filename*=UTF-8''rapport%20%C3%A9t%C3%A9.pdf"
+            expected = self.client.generate_presigned_url(
+                "get_object",
+                Params={
+                    "Bucket": "bucket",
+                    "Key": key,
+                    "ResponseContentDisposition": disposition,
+                },
+                ExpiresIn=300,
+            )
+            self.assertEqual(
+                batch.sign(key, {"response-content-disposition": disposition}),
+                expected,
+            )
+
+
+class SecureFileCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="owner", email="owner@example.com", password="secret"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        files = [
+            SecureFile.objects.create(
+                file=f"secure_files/{index}.pdf",
+                original_filename=f"{index}.pdf",
+                content_type="application/pdf",
+                file_size=1,
+                uploaded_by=self.user,
+            )
+            for index in range(5)
+        ]
+        # Rows sharing dtm_created must be neither skipped nor repeated
+        now = timezone.now()
+        SecureFile.objects.filter(pk__in=[f.pk for f in files[1:4]]).update(
+            dtm_created=now
+        )
+        SecureFile.objects.filter(pk=files[0].pk).update(
+            dtm_created=now - timedelta(minutes=1)
+        )
+        SecureFile.objects.filter(pk=files[4].pk).update(
+            dtm_created=now + timedelta(minutes=1)
+        )
+        self.expected = list(
+            SecureFile.objects.order_by("-dtm_created", "-id").values_list(
+                "slug", flat=True
+            )
+        )
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, [row["slug"] for row in response.data["results"]]
+
+    def test_pages_follow_dtm_created_then_id(self):
+        pages = []
+        url = f"{reverse('file-list')}?page_size=2"
+        while url:
+            data, slugs = self.get_page(url)
+            pages.append((data, slugs))
+            url = data["next"]
+
+        self.assertEqual([slug for _, slugs in pages for slug in slugs], self.expected)
+        self.assertIsNone(pages[0][0]["previous"])
+
+        # Going back from the last page returns the page before it
+        data, slugs = self.get_page(pages[-1][0]["previous"])
+        self.assertEqual(slugs, pages[-2][1])
+        self.assertIsNotNone(data["next"])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(f"{reverse('file-list')}?cursor=bm90LWEtY3Vyc29y")
+
+        self.assertEqual(response.status_code, 404)
+
+
+@mock.patch("app_files.deletion._send")
+class ScheduleDeletionTests(TestCase):
+    def test_names_in_one_transaction_are_sent_together(self, send):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                schedule_deletion(["a.pdf", ""])
+                schedule_deletion(["b.pdf"])
+                send.assert_not_called()
+
+        send.assert_called_once_with(["a.pdf", "b.pdf"])
+
+    def test_rolled_back_savepoint_sends_nothing(self, send):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                schedule_deletion(["kept.pdf"])
+                try:
+                    with transaction.atomic():
+                        schedule_deletion(["rolled_back.pdf"])
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                with transaction.atomic():
+                    schedule_deletion(["retried.pdf"])
+
+        self.assertEqual(
+            sorted(call.args[0] for call in send.call_args_list),
+            [["kept.pdf"], ["retried.pdf"]],
+        )
+
+    def test_nothing_to_delete(self, send):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            schedule_deletion(["", None])
+
+        self.assertEqual(callbacks, [])
+        send.assert_not_called()
+
+
+class ParseRangeTests(TestCase):
+    def test_ranges(self):
+        for header, expected in [
+            (None, None),
+            ("bytes=2-5", (2, 5)),
+            ("bytes=2-", (2, 9)),
+            ("bytes=-3", (7, 9)),
+            ("bytes=-30", (0, 9)),
+            ("bytes=5-30", (5, 9)),
+            ("bytes=0-1,4-5", None),
+            ("items=0-1", None),
+        ]:
+            self.assertEqual(parse_range(header, 10), expected, header)
+
+    def test_unsatisfiable_ranges(self):
+        for header in ["bytes=10-", "bytes=5-2", "bytes=-0"]:
+            with self.assertRaises(ValueError, msg=header):
+                parse_range(header, 10)
+
+
+class SignedLocalFileTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            USE_S3=False,
+            MEDIA_ROOT=media_root.name,
+            SECURE_FILES_ACCEL_REDIRECT=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_secure_file_storage().save("2026/01/report.txt", ContentFile(b"0123456789"))
+
+    def sign(self, expiration=300):
+        return sign_local_url(
+            "2026/01/report.txt", "report.txt", "attachment", expiration
+        )
+
+    def verify(self, url):
+        path, query = url.split("?")
+        params = dict(parse_qsl(query))
+        return verify_local_url(
+            unquote(path), params["disposition"], params["expires"], params["md5"]
+        )
+
+    def test_verify(self):
+        url = self.sign()
+
+        self.assertTrue(self.verify(url))
+        self.assertFalse(self.verify(self.sign(expiration=-1)))
+        self.assertIsNone(self.verify(url.replace("attachment", "inline")))
+        self.assertIsNone(verify_local_url(unquote(url), "attachment", "x", "md5"))
+        self.assertIsNone(
+            verify_local_url(unquote(url.split("?")[0]), "attachment", "1", "é")
+        )
+
+    def test_serves_file_and_ranges(self):
+        url = self.sign()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+
+        response = self.client.get(url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_stale_if_range_gets_whole_file(self):
+        url = self.sign()
+
+        response = self.client.get(url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"0-0"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    def test_bad_and_expired_links(self):
+        self.assertEqual(
+            self.client.get(self.sign().replace("md5=", "md5=x")).status_code, 403
+        )
+        self.assertEqual(self.client.get(self.sign(expiration=-1)).status_code, 410)
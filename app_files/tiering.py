@@ -0,0 +1,223 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import redis
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.db.models import Max, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+
+from app_files.access import get_redis_client
+from app_files.clients import get_default_s3_client
+from app_files.deletion import get_storage_key
+
+# Storage classes, warmest first. Only classes with instant retrieval are
+# used, so presigned URLs keep working whatever the tier.
+STANDARD = "STANDARD"
+STANDARD_IA = "STANDARD_IA"
+GLACIER_IR = "GLACIER_IR"
+STORAGE_CLASSES = [STANDARD, STANDARD_IA, GLACIER_IR]
+# Smaller objects are billed as 128 KiB in the infrequent access classes
+TIER_MIN_BYTES = 128 * 1024
+TIER_BATCH_SIZE = 500
+TIER_WORKERS = 8
+# A cold file is restored to STANDARD once downloaded RESTORE_MIN_DOWNLOADS
+# times within RESTORE_WINDOW seconds. Cold objects are read instantly, so a
+# single download is not worth a retrieval fee and an early deletion charge.
+RESTORE_KEY_PREFIX = "secure_files:restore:"
+RESTORE_MIN_DOWNLOADS = 3
+RESTORE_WINDOW = 86400
+
+
+def get_cold_storage_class(last_used, now):
+    """
+    Return the storage class for an object last used at ``last_used``.
+
+    STANDARD_IA_AFTER_DAYS and GLACIER_IR_AFTER_DAYS of 0 disable a tier.
+    """
+    idle = now - last_used
+    glacier_days = settings.SECURE_FILES_GLACIER_IR_AFTER_DAYS
+    ia_days = settings.SECURE_FILES_STANDARD_IA_AFTER_DAYS
+    if glacier_days and idle >= timedelta(days=glacier_days):
+        return GLACIER_IR
+    if ia_days and idle >= timedelta(days=ia_days):
+        return STANDARD_IA
+    return STANDARD
+
+
+def set_storage_class(name, storage_class):
+    """Rewrite a stored object in place in another storage class, server-side."""
+    key = get_storage_key(name)
+    get_default_s3_client().copy_object(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=key,
+        CopySource={"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Key": key},
+        StorageClass=storage_class,
+        MetadataDirective="COPY",
+    )
+
+
+def _set_storage_class(item):
+    name, storage_class = item
+    try:
+        set_storage_class(name, storage_class)
+    except (BotoCoreError, ClientError) as e:
+        print(f"Error moving {name} to {storage_class}: {e}")
+        return False
+    return True
+
+
+def move_objects(executor, files, targets):
+    """
+    Change the storage class of objects and record it on their files.
+
+    Args:
+        executor: Pool the copies run in
+        files (dict): Stored name -> SecureFile read from it
+        targets (dict): Stored name -> storage class to move it to
+
+    Returns:
+        int: Number of objects moved
+    """
+    from app_files.models import SecureFile
+
+    moved = {}
+    for (name, storage_class), ok in zip(
+        targets.items(), executor.map(_set_storage_class, targets.items())
+    ):
+        if ok:
+            moved.setdefault(storage_class, []).append(files[name])
+    # Files sharing an object share its blob
+    for storage_class, moved_files in moved.items():
+        SecureFile.objects.filter(
+            Q(pk__in=[secure_file.pk for secure_file in moved_files])
+            | Q(
+                blob_id__in=[
+                    secure_file.blob_id
+                    for secure_file in moved_files
+                    if secure_file.blob_id
+                ]
+            )
+        ).update(storage_class=storage_class)
+    return sum(len(moved_files) for moved_files in moved.values())
+
+
+def tier_cold_files(batch_size=TIER_BATCH_SIZE, workers=TIER_WORKERS, dry_run=False):
+    """
+    Move objects nobody downloaded lately to colder storage classes.
+
+    Files are read in primary key order, ``batch_size`` at a time, and their
+    objects rewritten with CopyObject by ``workers`` threads. Objects only
+    move to colder classes here; repeated downloads bring them back, see
+    ``schedule_restore()``.
+
+    Returns:
+        int: Number of objects moved (or that would move with ``dry_run``)
+    """
+    from app_files.models import SecureFile
+
+    if not getattr(settings, "USE_S3", False):
+        return 0
+
+    now = timezone.now()
+    queryset = (
+        SecureFile.objects.filter(
+            upload_status=SecureFile.UploadStatus.COMPLETE,
+            file_size__gte=TIER_MIN_BYTES,
+        )
+        .exclude(storage_class=GLACIER_IR)
+        .order_by("pk")
+        .only("pk", "file", "blob_id", "storage_class", "dtm_created")
+        .annotate(last_used=Coalesce("dtm_last_accessed", "dtm_created"))
+    )
+
+    total = 0
+    last_pk = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return total
+            last_pk = batch[-1].pk
+
+            # Files sharing an object may have been used more recently
+            blob_ids = {secure_file.blob_id for secure_file in batch} - {None}
+            blob_last_used = dict(
+                SecureFile.objects.filter(blob_id__in=blob_ids)
+                .order_by()
+                .values("blob_id")
+                .annotate(last_used=Max(Coalesce("dtm_last_accessed", "dtm_created")))
+                .values_list("blob_id", "last_used")
+            )
+
+            files = {}
+            targets = {}
+            for secure_file in batch:
+                name = secure_file.file.name
+                last_used = blob_last_used.get(
+                    secure_file.blob_id, secure_file.last_used
+                )
+                storage_class = get_cold_storage_class(last_used, now)
+                if STORAGE_CLASSES.index(storage_class) > STORAGE_CLASSES.index(
+                    secure_file.storage_class
+                ):
+                    files.setdefault(name, secure_file)
+                    targets.setdefault(name, storage_class)
+
+            if dry_run:
+                total += len(targets)
+            elif targets:
+                total += move_objects(executor, files, targets)
+
+
+def restore_files(file_ids):
+    """
+    Move the objects of cold files back to STANDARD.
+
+    Returns:
+        int: Number of objects moved
+    """
+    from app_files.models import SecureFile
+
+    files = {
+        secure_file.file.name: secure_file
+        for secure_file in SecureFile.objects.filter(pk__in=file_ids).exclude(
+            storage_class=STANDARD
+        )
+    }
+    with ThreadPoolExecutor(max_workers=TIER_WORKERS) as executor:
+        return move_objects(executor, files, dict.fromkeys(files, STANDARD))
+
+
+def schedule_restore(secure_file):
+    """
+    Bring a cold file back to STANDARD in the background once it is in use.
+
+    Downloads of a cold file are counted in Redis, in one round trip, and
+    the restore is queued by the RESTORE_MIN_DOWNLOADS-th download within
+    RESTORE_WINDOW. Its URL works meanwhile, the infrequent access classes
+    are read instantly. If Redis is unavailable nothing is restored.
+    """
+    if secure_file.storage_class == STANDARD:
+        return
+    key = f"{RESTORE_KEY_PREFIX}{secure_file.pk}"
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        # The window starts with the first download
+        pipe.set(key, 0, nx=True, ex=RESTORE_WINDOW)
+        pipe.incr(key)
+        _, downloads = pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error counting downloads of {secure_file.slug}: {e}")
+        return
+    if downloads != RESTORE_MIN_DOWNLOADS:
+        return
+
+    from app_files.tasks import restore_storage_class_task
+
+    try:
+        restore_storage_class_task.delay([secure_file.pk])
+    except OperationalError as e:
+        print(f"Error scheduling restore of {secure_file.slug}: {e}")
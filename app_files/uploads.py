@@ -0,0 +1,359 @@
+import math
+from datetime import timedelta
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from app_files.clients import get_default_s3_client
+from app_files.derivatives import schedule_derivatives
+from app_files.models import (
+    SecureFile,
+    get_extension,
+    get_file_path,
+    hash_stored_file,
+    matches_signature,
+)
+
+# Direct-to-S3 uploads: the API only signs requests, the bytes go from the
+# client straight to S3. Files up to MULTIPART_THRESHOLD use a single presigned
+# POST whose policy pins the key, content type and exact size. Larger files use
+# a multipart upload whose part URLs each sign the exact part Content-Length.
+
+UPLOAD_URL_EXPIRATION = 3600
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+MULTIPART_THRESHOLD = MULTIPART_PART_SIZE
+# S3 allows at most 10,000 parts per multipart upload
+MAX_PARTS = 10000
+# Pending uploads older than this are abandoned: their URLs expired long ago
+PENDING_UPLOAD_MAX_AGE = timedelta(days=1)
+EXPIRE_BATCH_SIZE = 500
+# Leading bytes of a direct upload checked against its type, as much as the
+# first chunk ContentValidationUploadHandler checks of an API upload
+SIGNATURE_CHECK_BYTES = 64 * 1024
+
+
+class DirectUploadsUnavailable(APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = "Direct uploads need S3 storage."
+    default_code = "direct_uploads_unavailable"
+
+
+def get_part_size(file_size):
+    """Return the part size used to split a file of ``file_size`` bytes."""
+    return max(MULTIPART_PART_SIZE, math.ceil(file_size / MAX_PARTS))
+
+
+def get_part_count(file_size):
+    return max(1, math.ceil(file_size / get_part_size(file_size)))
+
+
+def get_part_length(file_size, part_number):
+    """Return the exact byte length of part ``part_number`` (1-based)."""
+    part_size = get_part_size(file_size)
+    return min(part_size, file_size - (part_number - 1) * part_size)
+
+
+def _storage_acl(secure_file):
+    return secure_file.file.storage.default_acl
+
+
+def initiate_upload(
+    user, original_filename, content_type, file_size, description=None, expires_at=None
+):
+    """
+    Create a pending SecureFile and return what the client needs to upload it.
+
+    Returns:
+        tuple: (SecureFile instance, upload instructions dict)
+    """
+    secure_file = SecureFile(
+        original_filename=original_filename,
+        content_type=content_type,
+        file_size=file_size,
+        description=description,
+        expires_at=expires_at,
+        uploaded_by=user,
+        upload_status=SecureFile.UploadStatus.PENDING,
+    )
+    secure_file.slug = secure_file.generate_slug()
+    secure_file.file.name = get_file_path(secure_file, original_filename)
+
+    s3_client = get_default_s3_client()
+    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+    key = secure_file.get_storage_key()
+    acl = _storage_acl(secure_file)
+
+    try:
+        if file_size <= MULTIPART_THRESHOLD:
+            fields = {"Content-Type": content_type}
+            conditions = [
+                {"Content-Type": content_type},
+                ["content-length-range", file_size, file_size],
+            ]
+            if acl:
+                fields["acl"] = acl
+                conditions.append({"acl": acl})
+            presigned_post = s3_client.generate_presigned_post(
+                Bucket=bucket_name,
+                Key=key,
+                Fields=fields,
+                Conditions=conditions,
+                ExpiresIn=UPLOAD_URL_EXPIRATION,
+            )
+            upload = {
+                "method": "POST",
+                "url": presigned_post["url"],
+                "fields": presigned_post["fields"],
+            }
+        else:
+            params = {"Bucket": bucket_name, "Key": key, "ContentType": content_type}
+            if acl:
+                params["ACL"] = acl
+            response = s3_client.create_multipart_upload(**params)
+            secure_file.upload_id = response["UploadId"]
+            upload = {
+                "method": "MULTIPART",
+                "part_size": get_part_size(file_size),
+                "part_count": get_part_count(file_size),
+            }
+    except (BotoCoreError, ClientError) as e:
+        raise APIException("Could not initiate upload") from e
+
+    secure_file.save()
+    return secure_file, upload
+
+
+def presign_upload_parts(secure_file, part_numbers):
+    """Return presigned PUT URLs for the requested parts of a multipart upload."""
+    if not secure_file.upload_id:
+        raise ValidationError("This upload does not use multipart.")
+
+    part_count = get_part_count(secure_file.file_size)
+    invalid = [n for n in part_numbers if not 1 <= n <= part_count]
+    if invalid:
+        raise ValidationError(
+            {"part_numbers": f"Part numbers must be between 1 and {part_count}."}
+        )
+
+    s3_client = get_default_s3_client()
+    key = secure_file.get_storage_key()
+    return [
+        {
+            "part_number": part_number,
+            "url": s3_client.generate_presigned_url(
+                "upload_part",
+                Params={
+                    "Bucket": settings.AWS_STORAGE_BUCKET_NAME,
+                    "Key": key,
+                    "UploadId": secure_file.upload_id,
+                    "PartNumber": part_number,
+                    # Signed, so S3 rejects a part of any other size
+                    "ContentLength": get_part_length(
+                        secure_file.file_size, part_number
+                    ),
+                },
+                ExpiresIn=UPLOAD_URL_EXPIRATION,
+            ),
+        }
+        for part_number in part_numbers
+    ]
+
+
+def complete_upload(secure_file, parts=None):
+    """
+    Finalize a direct upload once the client reports it finished.
+
+    Multipart uploads are completed from the reported part ETags. The stored
+    object is then checked against the declared size and content type, and
+    its leading bytes against the file type, like API uploads are. The row
+    stays locked meanwhile, so a concurrent completion of the same upload
+    waits and then finds it complete. The content is hashed and shared with
+    identical files in the background, see ``deduplicate_upload()``.
+    """
+    with transaction.atomic():
+        secure_file = (
+            SecureFile.objects.select_for_update()
+            .filter(pk=secure_file.pk, upload_status=SecureFile.UploadStatus.PENDING)
+            .first()
+        )
+        if secure_file is None:
+            raise ValidationError("Upload is already complete.")
+
+        error = _verify_upload(secure_file, parts)
+        if error:
+            # Also removes the stored object
+            secure_file.delete()
+        else:
+            secure_file.upload_status = SecureFile.UploadStatus.COMPLETE
+            secure_file.upload_id = None
+            secure_file.save(
+                update_fields=["upload_status", "upload_id", "dtm_updated"]
+            )
+            schedule_deduplication(secure_file)
+    if error:
+        raise ValidationError(error)
+    return secure_file
+
+
+def _verify_upload(secure_file, parts):
+    """
+    Complete the multipart upload and check the stored object.
+
+    Returns:
+        str: Why the stored object is rejected, None if it is valid
+    """
+    s3_client = get_default_s3_client()
+    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+    key = secure_file.get_storage_key()
+
+    try:
+        if secure_file.upload_id:
+            if not parts:
+                raise ValidationError(
+                    {"parts": "Parts are required for multipart uploads."}
+                )
+            s3_client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=key,
+                UploadId=secure_file.upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": part["part_number"], "ETag": part["etag"]}
+                        for part in sorted(parts, key=lambda p: p["part_number"])
+                    ]
+                },
+            )
+        head = s3_client.head_object(Bucket=bucket_name, Key=key)
+        if (
+            head["ContentLength"] != secure_file.file_size
+            or head.get("ContentType") != secure_file.content_type
+        ):
+            return "Uploaded file does not match the declared size or type."
+
+        response = s3_client.get_object(
+            Bucket=bucket_name, Key=key, Range=f"bytes=0-{SIGNATURE_CHECK_BYTES - 1}"
+        )
+        leading_bytes = response["Body"].read()
+    except ClientError as e:
+        raise ValidationError("Upload is incomplete or could not be verified.") from e
+    except BotoCoreError as e:
+        raise APIException("Could not complete upload") from e
+
+    if not matches_signature(
+        get_extension(secure_file.original_filename), leading_bytes
+    ):
+        return "File content does not match its type."
+    return None
+
+
+def schedule_deduplication(secure_file):
+    """Hash a completed direct upload in the background once the transaction commits."""
+
+    def send():
+        from app_files.tasks import deduplicate_upload_task
+
+        deduplicate_upload_task.delay(secure_file.pk)
+
+    # A broker outage must not fail the upload, backfill_content_hashes and
+    # the thumbnail action catch up
+    transaction.on_commit(send, robust=True)
+
+
+def deduplicate_upload(file_id):
+    """
+    Hash a completed direct upload and share its object with identical files.
+
+    Its derivatives are scheduled afterwards, so they are made for (or
+    reused from) the object the file ends up on.
+
+    Returns:
+        bool: Whether the file was hashed, False if it is gone or already
+        hashed. None if the stored file could not be read.
+    """
+    queryset = SecureFile.objects.filter(
+        pk=file_id,
+        upload_status=SecureFile.UploadStatus.COMPLETE,
+        content_hash__isnull=True,
+    )
+    secure_file = queryset.first()
+    if secure_file is None:
+        return False
+    content_hash = hash_stored_file(secure_file)
+    if content_hash is None:
+        return None
+
+    with transaction.atomic():
+        # Deleted or hashed meanwhile
+        secure_file = queryset.select_for_update().first()
+        if secure_file is None:
+            return False
+        secure_file.attach_blob(content_hash)
+        schedule_derivatives([secure_file])
+    return True
+
+
+def abort_multipart_upload(secure_file):
+    """Abort the multipart upload of a pending file, so S3 drops its parts."""
+    try:
+        get_default_s3_client().abort_multipart_upload(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Key=secure_file.get_storage_key(),
+            UploadId=secure_file.upload_id,
+        )
+    except (BotoCoreError, ClientError) as e:
+        # The upload may already be gone (completed, aborted or expired)
+        print(f"Error aborting multipart upload: {e}")
+
+
+def abort_upload(secure_file):
+    """Abort a pending direct upload and discard its SecureFile."""
+    if secure_file.upload_id:
+        abort_multipart_upload(secure_file)
+
+    # Also removes an object that a presigned POST may already have stored
+    secure_file.delete()
+
+
+def expire_pending_uploads(
+    max_age=PENDING_UPLOAD_MAX_AGE, batch_size=EXPIRE_BATCH_SIZE
+):
+    """
+    Discard direct uploads left pending for longer than ``max_age``.
+
+    Their multipart uploads are aborted, so S3 stops billing for the parts.
+    The rows are then removed with ``bulk_delete()``, which releases their
+    usage and deletes any object a presigned POST stored.
+
+    Returns:
+        int: Number of uploads discarded
+    """
+    cutoff = timezone.now() - max_age
+    queryset = (
+        SecureFile.objects.filter(
+            upload_status=SecureFile.UploadStatus.PENDING, dtm_created__lt=cutoff
+        )
+        .order_by("pk")
+        .only("pk", "file", "upload_id")
+    )
+
+    expired = 0
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return expired
+        last_pk = batch[-1].pk
+
+        for secure_file in batch:
+            if secure_file.upload_id:
+                abort_multipart_upload(secure_file)
+        # Uploads completed meanwhile are kept
+        deleted, _ = SecureFile.objects.filter(
+            pk__in=[secure_file.pk for secure_file in batch],
+            upload_status=SecureFile.UploadStatus.PENDING,
+        ).bulk_delete()
+        expired += deleted
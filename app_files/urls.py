@@ -1,6 +1,6 @@
 from django.urls import path
 
-from .views import SecureFileViewSet
+from .views import SecureFileViewSet, signed_file
 
 urlpatterns = [
     # List and create files
@@ -9,6 +9,69 @@ urlpatterns = [
         SecureFileViewSet.as_view({"get": "list", "post": "create"}),
         name="file-list",
     ),
+    # Presigned URL cache counters (staff only)
+    path(
+        "files/cache-stats/",
+        SecureFileViewSet.as_view(
+            {"get": "cache_stats"}, **SecureFileViewSet.cache_stats.kwargs
+        ),
+        name="file-cache-stats",
+    ),
+    # Current user's storage usage and quota
+    path(
+        "files/usage/",
+        SecureFileViewSet.as_view({"get": "usage"}),
+        name="file-usage",
+    ),
+    # Upload many files in one request
+    path(
+        "files/bulk/",
+        SecureFileViewSet.as_view({"post": "bulk_upload"}),
+        name="file-bulk-upload",
+    ),
+    # Download many files as one ZIP archive
+    path(
+        "files/archive/",
+        SecureFileViewSet.as_view(
+            {"post": "archive"}, **SecureFileViewSet.archive.kwargs
+        ),
+        name="file-archive",
+    ),
+    path(
+        "files/archives/<str:archive_slug>/",
+        SecureFileViewSet.as_view({"get": "archive_detail"}),
+        name="file-archive-detail",
+    ),
+    # Expiring signed links to local files (checked by nginx when it is in front)
+    path(
+        "files/signed/<path:name>/<str:filename>",
+        signed_file,
+        name="file-signed",
+    ),
+    # Update and delete many files in one request
+    path(
+        "files/bulk-update/",
+        SecureFileViewSet.as_view(
+            {"patch": "bulk_partial_update"},
+            **SecureFileViewSet.bulk_partial_update.kwargs,
+        ),
+        name="file-bulk-update",
+    ),
+    path(
+        "files/bulk-delete/",
+        SecureFileViewSet.as_view(
+            {"post": "bulk_destroy"}, **SecureFileViewSet.bulk_destroy.kwargs
+        ),
+        name="file-bulk-delete",
+    ),
+    # Direct-to-S3 uploads
+    path(
+        "files/uploads/",
+        SecureFileViewSet.as_view(
+            {"post": "upload_initiate"}, **SecureFileViewSet.upload_initiate.kwargs
+        ),
+        name="file-upload-initiate",
+    ),
     # Retrieve, update and delete specific file
     path(
         "files/<str:slug>/",
@@ -28,4 +91,38 @@ urlpatterns = [
         SecureFileViewSet.as_view({"get": "download"}),
         name="file-download",
     ),
+    # Presigned URLs of image thumbnails and previews
+    path(
+        "files/<str:slug>/thumbnail/",
+        SecureFileViewSet.as_view({"get": "thumbnail"}),
+        name="file-thumbnail",
+    ),
+    # Stream the file content (redirects to S3 when files live there)
+    path(
+        "files/<str:slug>/content/",
+        SecureFileViewSet.as_view({"get": "content"}),
+        name="file-content",
+    ),
+    # Direct-to-S3 upload parts, completion and abort
+    path(
+        "files/<str:slug>/upload/parts/",
+        SecureFileViewSet.as_view(
+            {"post": "upload_parts"}, **SecureFileViewSet.upload_parts.kwargs
+        ),
+        name="file-upload-parts",
+    ),
+    path(
+        "files/<str:slug>/upload/complete/",
+        SecureFileViewSet.as_view(
+            {"post": "upload_complete"}, **SecureFileViewSet.upload_complete.kwargs
+        ),
+        name="file-upload-complete",
+    ),
+    path(
+        "files/<str:slug>/upload/abort/",
+        SecureFileViewSet.as_view(
+            {"post": "upload_abort"}, **SecureFileViewSet.upload_abort.kwargs
+        ),
+        name="file-upload-abort",
+    ),
 ]
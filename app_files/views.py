@@ -1,30 +1,130 @@
-from django.core.exceptions import ValidationError
+import mimetypes
+
+from django.conf import settings
+from django.db import transaction
+from django.http import (
+    Http404,
+    HttpResponseForbidden,
+    HttpResponseGone,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header
+from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import APIException
-from rest_framework.parsers import FormParser, MultiPartParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
-from .models import SecureFile
-from .serializers import SecureFileSerializer
+from app_core.views import BulkCoreModelMixin
+
+from . import services, uploads
+from .access import record_access
+from .archives import (
+    ARCHIVE_CONTENT_TYPE,
+    ARCHIVE_FILENAME,
+    create_archive,
+    iter_archive,
+)
+from .cache import presigned_url_cache
+from .conditional import get_list_etag, get_object_validators, set_validators
+from .derivatives import get_pending_sizes, is_image, requeue_derivatives
+from .handlers import ContentValidationUploadHandler, S3MultipartUploadHandler
+from .models import FileArchive, SecureFile
+from .pagination import SecureFileCursorPagination, SecureFileSearchPagination
+from .quotas import check_quota, get_usage
+from .responses import serve_local_file
+from .search import SecureFileSearchFilter
+from .serializers import (
+    ArchiveRequestSerializer,
+    ExpiresAtField,
+    FileArchiveSerializer,
+    SecureFileSerializer,
+    UploadCompleteSerializer,
+    UploadInitiateSerializer,
+    UploadPartsSerializer,
+)
+from .signing import verify_local_url
+from .storage import LocalSecureFileStorage, get_secure_file_storage
+from .tiering import schedule_restore
 
+# Actions that operate on direct uploads the client has not finished yet
+PENDING_UPLOAD_ACTIONS = ["upload_parts", "upload_complete", "upload_abort"]
+# Actions only available with S3 storage
+DIRECT_UPLOAD_ACTIONS = ["upload_initiate", *PENDING_UPLOAD_ACTIONS]
 
-class SecureFileViewSet(viewsets.ModelViewSet):
+
+class SecureFileViewSet(BulkCoreModelMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing secure file uploads and downloads.
+
+    Files are created in bulk by ``bulk_upload``; ``bulk_partial_update`` and
+    ``bulk_destroy`` come from BulkCoreModelMixin.
     """
 
     queryset = SecureFile.objects.all()
     serializer_class = SecureFileSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
+    pagination_class = SecureFileCursorPagination
+    filter_backends = [DjangoFilterBackend, SecureFileSearchFilter]
     lookup_field = "slug"
 
+    @property
+    def paginator(self):
+        """Ranked search results are paginated by page number instead of cursor."""
+        if not hasattr(self, "_paginator"):
+            if self.action == "list" and SecureFileSearchFilter.get_query(self.request):
+                self._paginator = SecureFileSearchPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            self.action in DIRECT_UPLOAD_ACTIONS
+            and not S3MultipartUploadHandler.is_enabled()
+        ):
+            raise uploads.DirectUploadsUnavailable()
+
     def get_queryset(self):
         """Filter files based on user permissions."""
-        return self.queryset.filter(uploaded_by=self.request.user)
+        upload_status = (
+            SecureFile.UploadStatus.PENDING
+            if self.action in PENDING_UPLOAD_ACTIONS
+            else SecureFile.UploadStatus.COMPLETE
+        )
+        # Expired files are hidden until the purge task deletes them
+        return self.queryset.filter(
+            uploaded_by=self.request.user, upload_status=upload_status
+        ).exclude(expires_at__lte=timezone.now())
+
+    def list(self, request, *args, **kwargs):
+        """List files, answering 304 when nothing changed since the client's copy."""
+        etag = get_list_etag(request, self.filter_queryset(self.get_queryset()))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return a file, answering 304 before it is serialized when unchanged."""
+        instance = self.get_object()
+        etag, last_modified = get_object_validators(request, instance)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        return set_validators(response, etag, last_modified)
 
     @extend_schema(
         description="Upload a new file to secure storage",
@@ -34,6 +134,7 @@ class SecureFileViewSet(viewsets.ModelViewSet):
                 "properties": {
                     "file": {"type": "string", "format": "binary"},
                     "description": {"type": "string"},
+                    "expires_at": {"type": "string", "format": "date-time"},
                 },
                 "required": ["file"],
             }
@@ -41,6 +142,25 @@ class SecureFileViewSet(viewsets.ModelViewSet):
     )
     def create(self, request, *args, **kwargs):
         """Handle file upload with validation."""
+        # Users already at their quota are turned away before the body is read
+        check_quota(request.user, 1, 0, lock=False)
+
+        stream_handler = None
+        if S3MultipartUploadHandler.is_enabled():
+            # Must be installed before the request body is parsed
+            stream_handler = S3MultipartUploadHandler(request)
+            request.upload_handlers.insert(0, stream_handler)
+        # Runs first, so bad files are rejected before anything is stored
+        request.upload_handlers.insert(0, ContentValidationUploadHandler(request))
+
+        try:
+            return self._create(request)
+        except Exception:
+            if stream_handler is not None:
+                stream_handler.abort()
+            raise
+
+    def _create(self, request):
         if "file" not in request.FILES:
             raise ValidationError("No file provided")
 
@@ -53,12 +173,114 @@ class SecureFileViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+        with transaction.atomic():
+            check_quota(request.user, 1, file_obj.size)
+            self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
+    @extend_schema(
+        description="Upload many files in one request. Files are validated and "
+        "stored independently; rejected files are listed in `errors`.",
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {
+                    "files": {
+                        "type": "array",
+                        "items": {"type": "string", "format": "binary"},
+                    },
+                    "description": {"type": "string"},
+                    "expires_at": {"type": "string", "format": "date-time"},
+                },
+                "required": ["files"],
+            }
+        },
+    )
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_upload(self, request):
+        """Store every file in the ``files`` field with one bulk insert."""
+        check_quota(request.user, 1, 0, lock=False)
+
+        validator = ContentValidationUploadHandler(
+            request, field_name="files", skip_rejected=True
+        )
+        request.upload_handlers.insert(0, validator)
+        file_objs = request.FILES.getlist("files")
+        if not file_objs and not validator.rejected:
+            raise ValidationError("No files provided")
+        if validator.index + 1 > services.BULK_UPLOAD_MAX_FILES:
+            raise ValidationError(
+                f"At most {services.BULK_UPLOAD_MAX_FILES} files can be uploaded at once"
+            )
+
+        try:
+            expires_at = ExpiresAtField().run_validation(
+                request.data.get("expires_at") or None
+            )
+        except ValidationError as e:
+            raise ValidationError({"expires_at": e.detail})
+
+        secure_files, errors = services.create_secure_files(
+            file_objs,
+            description=request.data.get("description"),
+            user=request.user,
+            expires_at=expires_at,
+        )
+        # Report indices among all the files sent, including the skipped ones
+        rejected = {index for index, _, _ in validator.rejected}
+        sent_indices = [i for i in range(validator.index + 1) if i not in rejected]
+        for error in errors:
+            error["index"] = sent_indices[error["index"]]
+        errors.extend(
+            {"index": index, "filename": filename, "errors": {"file": [message]}}
+            for index, filename, message in validator.rejected
+        )
+        errors.sort(key=lambda error: error["index"])
+        serializer = self.get_serializer(secure_files, many=True)
+        return Response(
+            {"files": serializer.data, "errors": errors},
+            status=(
+                status.HTTP_201_CREATED if secure_files else status.HTTP_400_BAD_REQUEST
+            ),
+        )
+
+    @extend_schema(
+        description="Return the file content. S3 files redirect to a presigned "
+        "URL; local files are served with Range, ETag and Last-Modified support, "
+        "through nginx X-Accel-Redirect when enabled.",
+        responses={(200, "*/*"): OpenApiTypes.BINARY},
+    )
+    @action(detail=True, methods=["get"])
+    def content(self, request, slug=None):
+        """Stream the file after the permission check, without buffering it."""
+        instance = self.get_object()
+
+        disposition_type = request.query_params.get("disposition", "inline")
+        if disposition_type not in ["attachment", "inline"]:
+            disposition_type = "inline"
+
+        record_access(instance)
+        if isinstance(instance.file.storage, LocalSecureFileStorage):
+            return serve_local_file(
+                request,
+                instance.file.storage,
+                instance.file.name,
+                instance.content_type,
+                instance.original_filename,
+                disposition_type,
+            )
+
+        url = instance.generate_presigned_url(
+            expiration=300, disposition_type=disposition_type
+        )
+        if url:
+            schedule_restore(instance)
+            return HttpResponseRedirect(url)
+        raise APIException("Could not generate download URL")
+
     @action(detail=True, methods=["get"])
     def download(self, request, slug=None):
         """Generate a presigned download URL for the file."""
@@ -74,6 +296,8 @@ class SecureFileViewSet(viewsets.ModelViewSet):
             expiration=300, disposition_type=disposition_type
         )
         if url:
+            record_access(instance)
+            schedule_restore(instance)
             return Response(
                 {
                     "download_url": url,
@@ -83,3 +307,217 @@ class SecureFileViewSet(viewsets.ModelViewSet):
             )
 
         raise APIException("Could not generate download URL")
+
+    @extend_schema(
+        description="Download many files as one ZIP archive. Archives up to "
+        "SECURE_FILES_ARCHIVE_STREAM_MAX_BYTES are streamed in the response; "
+        "larger ones, or with `background`, are built in the background and "
+        "answered with 202 and the archive to poll for its download URL.",
+        request=ArchiveRequestSerializer,
+        responses={
+            (200, ARCHIVE_CONTENT_TYPE): OpenApiTypes.BINARY,
+            202: FileArchiveSerializer,
+        },
+    )
+    @action(detail=False, methods=["post"], parser_classes=[JSONParser, FormParser])
+    def archive(self, request):
+        """Stream a ZIP of the files as it is built, or queue building it."""
+        serializer = ArchiveRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        slugs = list(dict.fromkeys(serializer.validated_data["slugs"]))
+        compression = serializer.validated_data["compression"]
+
+        files = self.get_queryset().in_bulk(slugs, field_name="slug")
+        missing = [slug for slug in slugs if slug not in files]
+        if missing:
+            raise NotFound({"missing": missing})
+        files = [files[slug] for slug in slugs]
+
+        total_bytes = sum(secure_file.file_size for secure_file in files)
+        if (
+            serializer.validated_data["background"]
+            or total_bytes > settings.SECURE_FILES_ARCHIVE_STREAM_MAX_BYTES
+        ):
+            with transaction.atomic():
+                archive = create_archive(request.user, files, compression)
+            return Response(
+                FileArchiveSerializer(archive).data, status=status.HTTP_202_ACCEPTED
+            )
+
+        response = StreamingHttpResponse(
+            iter_archive(files, compression), content_type=ARCHIVE_CONTENT_TYPE
+        )
+        response["Content-Disposition"] = content_disposition_header(
+            True, ARCHIVE_FILENAME
+        )
+        # Pass chunks on as they come instead of spooling them in nginx
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @extend_schema(
+        description="Return the status of an archive built in the background, "
+        "with its download URL once it is ready.",
+        responses=FileArchiveSerializer,
+    )
+    @action(detail=False, methods=["get"], url_path=r"archives/(?P<archive_slug>\w+)")
+    def archive_detail(self, request, archive_slug=None):
+        """Poll an archive requested from ``archive``."""
+        archive = get_object_or_404(
+            FileArchive, slug=archive_slug, created_by=request.user
+        )
+        return Response(FileArchiveSerializer(archive).data)
+
+    @extend_schema(
+        description="Return URLs of the image thumbnail and preview. Responds "
+        "202 while they are still being generated."
+    )
+    @action(detail=True, methods=["get"])
+    def thumbnail(self, request, slug=None):
+        """Presigned URLs of the image derivatives, generated after upload."""
+        instance = self.get_object()
+        if not is_image(instance.file.name):
+            raise NotFound("Thumbnails are only available for images")
+
+        if get_pending_sizes(instance):
+            # Also recovers files whose task was lost
+            requeue_derivatives(instance)
+            return Response({"status": "pending"}, status=status.HTTP_202_ACCEPTED)
+        return Response(instance.generate_derivative_urls(expiration=300))
+
+    @extend_schema(
+        description="Return the number and total size of the user's files, "
+        "and their quota (0 means no limit).",
+        request=None,
+    )
+    @action(detail=False, methods=["get"])
+    def usage(self, request):
+        """Read the user's usage counters, one primary key lookup."""
+        usage = get_usage(request.user)
+        return Response(
+            {
+                "file_count": usage.file_count,
+                "total_bytes": usage.total_bytes,
+                "quota_files": settings.STORAGE_QUOTA_FILES,
+                "quota_bytes": settings.STORAGE_QUOTA_BYTES,
+            }
+        )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="cache-stats",
+        permission_classes=[IsAuthenticated, IsAdminUser],
+    )
+    def cache_stats(self, request):
+        """Presigned URL cache hit/miss counters for this worker process."""
+        return Response(
+            {"enabled": presigned_url_cache.enabled, **presigned_url_cache.stats()}
+        )
+
+    @extend_schema(
+        description="Start a direct-to-S3 upload. Returns a presigned POST for small "
+        "files, or a multipart upload for large ones.",
+        request=UploadInitiateSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="uploads",
+        parser_classes=[JSONParser, FormParser],
+    )
+    def upload_initiate(self, request):
+        """Create a pending file and sign the upload request(s) for it."""
+        serializer = UploadInitiateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            check_quota(request.user, 1, serializer.validated_data["file_size"])
+            secure_file, upload = uploads.initiate_upload(
+                request.user, **serializer.validated_data
+            )
+        return Response(
+            {"slug": secure_file.slug, **upload}, status=status.HTTP_201_CREATED
+        )
+
+    @extend_schema(
+        description="Presign upload URLs for parts of a multipart upload",
+        request=UploadPartsSerializer,
+    )
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="upload/parts",
+        parser_classes=[JSONParser, FormParser],
+    )
+    def upload_parts(self, request, slug=None):
+        """Return presigned PUT URLs for the requested part numbers."""
+        instance = self.get_object()
+        serializer = UploadPartsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        parts = uploads.presign_upload_parts(
+            instance, serializer.validated_data["part_numbers"]
+        )
+        return Response({"parts": parts})
+
+    @extend_schema(
+        description="Finalize a direct upload once all bytes are in S3",
+        request=UploadCompleteSerializer,
+        responses=SecureFileSerializer,
+    )
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="upload/complete",
+        parser_classes=[JSONParser, FormParser],
+    )
+    def upload_complete(self, request, slug=None):
+        """Verify the uploaded object and mark the file complete."""
+        instance = self.get_object()
+        serializer = UploadCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        instance = uploads.complete_upload(
+            instance, serializer.validated_data.get("parts")
+        )
+        return Response(self.get_serializer(instance).data)
+
+    @extend_schema(description="Abort a direct upload and discard the pending file")
+    @action(detail=True, methods=["post"], url_path="upload/abort")
+    def upload_abort(self, request, slug=None):
+        """Abort the upload and delete the pending file."""
+        instance = self.get_object()
+        uploads.abort_upload(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def signed_file(request, name, filename):
+    """
+    Serve a local file from a signed link, when nginx does not check it itself.
+
+    The link is the authorization, so no user is required.
+    """
+    disposition_type = request.GET.get("disposition", "")
+    valid = verify_local_url(
+        request.path,
+        disposition_type,
+        request.GET.get("expires"),
+        request.GET.get("md5"),
+    )
+    if valid is None:
+        return HttpResponseForbidden()
+    if not valid:
+        return HttpResponseGone()
+
+    storage = get_secure_file_storage()
+    if not isinstance(storage, LocalSecureFileStorage) or not storage.exists(name):
+        raise Http404
+    content_type, _ = mimetypes.guess_type(filename)
+    return serve_local_file(
+        request,
+        storage,
+        name,
+        content_type or "application/octet-stream",
+        filename,
+        disposition_type,
+    )
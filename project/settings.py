@@ -14,6 +14,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -228,6 +229,64 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 CELERY_BROKER_URL = REDIS_URL
 BROKER_CONNECTION_RETRY_ON_STARTUP = True
 # CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-storage-usage": {
+        "task": "app_files.tasks.reconcile_storage_usage_task",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "purge-expired-archives": {
+        "task": "app_files.tasks.purge_expired_archives_task",
+        "schedule": crontab(minute=15),
+    },
+    "flush-access-counts": {
+        "task": "app_files.tasks.flush_access_counts_task",
+        "schedule": crontab(minute="*/5"),
+    },
+    "expire-pending-uploads": {
+        "task": "app_files.tasks.expire_pending_uploads_task",
+        "schedule": crontab(minute=50),
+    },
+    "purge-expired-files": {
+        "task": "app_files.tasks.purge_expired_files_task",
+        "schedule": crontab(minute="*/15"),
+    },
+    "tier-cold-files": {
+        "task": "app_files.tasks.tier_cold_files_task",
+        "schedule": crontab(hour=4, minute=30),
+    },
+    "purge-expired-otps": {
+        "task": "app_auth.tasks.purge_expired_otps_task",
+        "schedule": crontab(minute=45),
+    },
+}
+
+# OTP store: "redis" (expired by TTL) or "db" (purged hourly)
+OTP_BACKEND = os.getenv("OTP_BACKEND", "redis")
+
+# Cache settings
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
+
+# Presigned URL cache: "redis", "locmem" or empty to disable
+PRESIGNED_URL_CACHE = os.getenv("PRESIGNED_URL_CACHE", "")
+if PRESIGNED_URL_CACHE == "redis":
+    CACHES["presigned_urls"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "presigned_urls",
+    }
+elif PRESIGNED_URL_CACHE == "locmem":
+    CACHES["presigned_urls"] = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "presigned_urls",
+    }
+# Cached URLs are kept for this fraction of their expiration
+PRESIGNED_URL_CACHE_TTL_FRACTION = float(
+    os.getenv("PRESIGNED_URL_CACHE_TTL_FRACTION", "0.5")
+)
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "Django API",
@@ -239,12 +298,15 @@ SPECTACULAR_SETTINGS = {
 
 # AWS S3 Settings
 
-if os.getenv("USE_S3", "False") == "True":
+USE_S3 = os.getenv("USE_S3", "False") == "True"
+if USE_S3:
     # S3 Bucket Config
     AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
     AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME")
     AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME", "us-east-1")
+    # S3-compatible stand-in (moto, MinIO, ...) for local runs, empty for AWS
+    AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None
     AWS_DEFAULT_ACL = None
     AWS_S3_OBJECT_PARAMETERS = {
         "CacheControl": "max-age=86400",
@@ -259,6 +321,52 @@ else:
     MEDIA_URL = "/media/"
     MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Local secure file downloads: when nginx proxies the app, hand transfers to
+# its internal location with X-Accel-Redirect (see server/config/nginx.conf)
+SECURE_FILES_ACCEL_REDIRECT = (
+    os.getenv("SECURE_FILES_ACCEL_REDIRECT", "False") == "True"
+)
+SECURE_FILES_ACCEL_PREFIX = "/protected/secure_files/"
+# Key of the expiring local file links, shared with nginx's secure_link_md5
+SECURE_LINK_SECRET = os.getenv("SECURE_LINK_SECRET", SECRET_KEY)
+
+# Key layout of new stored files: "hashed" (<hash shard>/<slug>.<ext>, spread
+# over S3 prefixes) or "date" (YYYY/MM/<slug>.<ext>). Existing objects are
+# moved with the migrate_storage_keys command.
+SECURE_FILES_KEY_LAYOUT = os.getenv("SECURE_FILES_KEY_LAYOUT", "hashed")
+
+# Count downloads per file in Redis (see app_files/access.py)
+SECURE_FILES_ACCESS_COUNTERS = os.getenv("ACCESS_COUNTERS", "True") == "True"
+
+# Days without a download after which objects move to STANDARD_IA and
+# GLACIER_IR storage classes, 0 to disable a tier
+SECURE_FILES_STANDARD_IA_AFTER_DAYS = int(os.getenv("STANDARD_IA_AFTER_DAYS", "30"))
+SECURE_FILES_GLACIER_IR_AFTER_DAYS = int(os.getenv("GLACIER_IR_AFTER_DAYS", "90"))
+
+# Per-user storage quota, 0 for no limit
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES", "0"))
+STORAGE_QUOTA_FILES = int(os.getenv("STORAGE_QUOTA_FILES", "0"))
+
+# Image derivatives generated after upload: variant -> maximum (width, height)
+SECURE_FILES_DERIVATIVE_SIZES = {
+    "thumbnail": (
+        int(os.getenv("THUMBNAIL_SIZE", "256")),
+        int(os.getenv("THUMBNAIL_SIZE", "256")),
+    ),
+    "preview": (
+        int(os.getenv("PREVIEW_SIZE", "1280")),
+        int(os.getenv("PREVIEW_SIZE", "1280")),
+    ),
+}
+
+# ZIP archives of more bytes than this are built by a Celery task and stored,
+# smaller ones are streamed in the response
+SECURE_FILES_ARCHIVE_STREAM_MAX_BYTES = int(
+    os.getenv("ARCHIVE_STREAM_MAX_BYTES", str(512 * 1024 * 1024))
+)
+# Hours stored archives are kept
+SECURE_FILES_ARCHIVE_TTL_HOURS = int(os.getenv("ARCHIVE_TTL_HOURS", "24"))
+
 # Logging settings
 if DEBUG:
     LOG_LEVEL = "DEBUG"